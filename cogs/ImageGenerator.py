@@ -1,18 +1,26 @@
 import discord
-from discord.ext import commands
+from discord import app_commands
+from discord.ext import commands, tasks
+import io
 import os
+import sys
 import asyncio
-import torch
+import pickle
+import psutil
 import pathlib
 import logging
-from asyncio import Semaphore
+import time
+import json
+import random
+import hashlib
+import threading
+from collections import OrderedDict, deque
 from typing import Optional
-from PIL import Image
 import uuid
 import sqlite3
 from datetime import datetime
-from diffusers import StableDiffusion3Pipeline
 from dotenv import load_dotenv
+from image_worker import IMAGE_FORMATS
 
 # Configure logging
 logger = logging.getLogger('ImageGenerator')
@@ -29,18 +37,544 @@ os.makedirs(IMAGE_SAVE_DIRECTORY, exist_ok=True)
 load_dotenv('token.env')
 HUGGINGFACE_TOKEN = os.getenv('HUGGINGFACE_TOKEN')
 
+# Interaction tokens last 15 minutes; jobs older than this can no longer be updated
+INTERACTION_LIFETIME_SECONDS = 14 * 60
+
+# Priority tiers, lowest value is served first
+PRIORITY_NAMES = {0: "Staff", 1: "Booster", 2: "Standard"}
+
+# Quality tiers offered to users, mapped to pipeline settings
+QUALITY_TIERS = {
+    'draft': {'num_inference_steps': 12, 'width': 512, 'height': 512},
+    'standard': {'num_inference_steps': 28, 'width': 768, 'height': 768},
+    'high': {'num_inference_steps': 50, 'width': 1024, 'height': 1024},
+}
+
+# Reject requests predicted to wait longer than this many seconds (must stay under the interaction lifetime)
+IMAGE_MAX_QUEUE_WAIT = float(os.getenv('IMAGE_MAX_QUEUE_WAIT', 600))
+
+# Batching: compatible jobs are generated together in one pipeline call
+IMAGE_BATCH_SIZE = int(os.getenv('IMAGE_BATCH_SIZE', 4))
+IMAGE_BATCH_WINDOW = float(os.getenv('IMAGE_BATCH_WINDOW', 1.5))  # Seconds to wait for more jobs
+
+# Result cache limits
+IMAGE_CACHE_DIRECTORY = os.path.join(IMAGE_SAVE_DIRECTORY, "cache")
+IMAGE_CACHE_MAX_MB = int(os.getenv('IMAGE_CACHE_MAX_MB', 2048))
+IMAGE_MAX_AGE_DAYS = int(os.getenv('IMAGE_MAX_AGE_DAYS', 30))
+# Set to 0 to skip writing generated images to disk (disables the cache)
+IMAGE_ARCHIVE = os.getenv('IMAGE_ARCHIVE', '1') != '0'
+
+# Free the model after this many idle minutes (0 keeps it loaded)
+IMAGE_IDLE_UNLOAD_MINUTES = float(os.getenv('IMAGE_IDLE_UNLOAD_MINUTES', 30))
+
+# Limits for the out-of-process worker
+IMAGE_WORKER_MAX_MEMORY_MB = int(os.getenv('IMAGE_WORKER_MAX_MEMORY_MB', 24576))
+IMAGE_WORKER_LOAD_TIMEOUT = float(os.getenv('IMAGE_WORKER_LOAD_TIMEOUT', 900))
+IMAGE_WORKER_BATCH_TIMEOUT = float(os.getenv('IMAGE_WORKER_BATCH_TIMEOUT', 600))
+
+# Progress reporting: seconds between status edits, and steps between latent previews (0 disables them)
+IMAGE_PROGRESS_INTERVAL = float(os.getenv('IMAGE_PROGRESS_INTERVAL', 2.0))
+IMAGE_PREVIEW_EVERY = int(os.getenv('IMAGE_PREVIEW_EVERY', 0))
+
+# The worker module lives in the project root, next to bot.py
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+class ImageWorkerError(Exception):
+    """Raised when the image worker process fails, times out or exits."""
+
+class ImageWorkerProcess:
+    """
+    Owns the ``image_worker`` subprocess that runs the diffusion pipeline.
+
+    Requests and replies are length-prefixed pickle frames over the process's
+    stdin and stdout (see image_worker.py). If the process exits, every pending
+    request fails and the next request starts a fresh worker.
+    """
+
+    def __init__(self, model_path: str):
+        self.model_path = model_path
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.reader_task: Optional[asyncio.Task] = None
+        self.ready: Optional[asyncio.Future] = None
+        self.pending = {}  # batch_id: Future resolved with the reply
+        self.progress_handlers = {}  # batch_id: callable(step, total, preview)
+        self.kill_reason = None
+
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    def is_ready(self) -> bool:
+        return self.is_running() and self.ready.done() and not self.ready.exception()
+
+    async def start(self, timeout: float):
+        """Start the worker if needed and wait until its pipeline is loaded.
+
+        Raises:
+            ImageWorkerError: If the worker fails to load the model in time.
+        """
+        if not self.is_running():
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, '-m', 'image_worker', self.model_path,
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, cwd=str(PROJECT_ROOT)
+            )
+            self.ready = asyncio.get_event_loop().create_future()
+            self.kill_reason = None
+            self.reader_task = asyncio.create_task(self._read_replies(self.process, self.ready))
+            logger.info(f"Started image worker process {self.process.pid}")
+        try:
+            await asyncio.wait_for(asyncio.shield(self.ready), timeout=timeout)
+        except asyncio.TimeoutError:
+            await self.kill("model load timed out")
+            raise ImageWorkerError(f"The image model did not load within {timeout:.0f}s.")
+
+    async def request(self, message: dict, timeout: float, on_progress=None) -> dict:
+        """Send a message to the worker and wait for the reply with the same batch_id.
+
+        Args:
+            message: The request to send.
+            timeout: Seconds to wait for the reply before killing the worker.
+            on_progress: Optional function called with (step, total, preview) for progress messages.
+
+        Raises:
+            ImageWorkerError: If the worker reports an error, exits or times out.
+        """
+        future = asyncio.get_event_loop().create_future()
+        self.pending[message['batch_id']] = future
+        if on_progress is not None:
+            self.progress_handlers[message['batch_id']] = on_progress
+        data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            self.process.stdin.write(len(data).to_bytes(4, 'big') + data)
+            await self.process.stdin.drain()
+            reply = await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            await self.kill("batch timed out")
+            raise ImageWorkerError(f"Image generation exceeded the {timeout:.0f}s time limit.")
+        except (BrokenPipeError, ConnectionResetError):
+            raise ImageWorkerError("The image worker exited unexpectedly.")
+        finally:
+            self.pending.pop(message['batch_id'], None)
+            self.progress_handlers.pop(message['batch_id'], None)
+        if reply['type'] == 'error':
+            raise ImageWorkerError(reply['error'])
+        return reply
+
+    async def _read_replies(self, process, ready: asyncio.Future):
+        """Dispatch replies from the worker until it exits, then fail whatever is still pending."""
+        error = None
+        try:
+            while True:
+                header = await process.stdout.readexactly(4)
+                reply = pickle.loads(await process.stdout.readexactly(int.from_bytes(header, 'big')))
+                if reply['type'] == 'ready':
+                    ready.set_result(reply['device'])
+                elif reply['type'] == 'progress':
+                    handler = self.progress_handlers.get(reply['batch_id'])
+                    if handler is not None:
+                        handler(reply['step'], reply['total'], reply['preview'])
+                elif reply['batch_id'] is None:
+                    error = reply['error']
+                elif reply['batch_id'] in self.pending and not self.pending[reply['batch_id']].done():
+                    self.pending[reply['batch_id']].set_result(reply)
+        except asyncio.IncompleteReadError:
+            pass
+        returncode = await process.wait()
+        error = error or self.kill_reason or f"The image worker exited with code {returncode}."
+        logger.warning(f"Image worker process {process.pid} exited: {error}")
+        if not ready.done():
+            ready.set_exception(ImageWorkerError(error))
+        for future in list(self.pending.values()):
+            if not future.done():
+                future.set_exception(ImageWorkerError(error))
+
+    def memory_mb(self) -> float:
+        """Return the resident memory of the worker and its children in MB."""
+        if not self.is_running():
+            return 0.0
+        try:
+            process = psutil.Process(self.process.pid)
+            rss = process.memory_info().rss + sum(child.memory_info().rss for child in process.children(recursive=True))
+        except psutil.Error:
+            return 0.0
+        return rss / (1024 * 1024)
+
+    async def kill(self, reason: str):
+        """Kill the worker immediately, failing pending requests with the reason."""
+        if self.is_running():
+            self.kill_reason = reason
+            self.process.kill()
+            await self.process.wait()
+
+    async def stop(self):
+        """Ask the worker to exit cleanly, killing it if it does not."""
+        if not self.is_running():
+            return
+        try:
+            data = pickle.dumps({'type': 'shutdown'})
+            self.process.stdin.write(len(data).to_bytes(4, 'big') + data)
+            await self.process.stdin.drain()
+            await asyncio.wait_for(self.process.wait(), timeout=10)
+        except (asyncio.TimeoutError, BrokenPipeError, ConnectionResetError):
+            await self.kill("worker stopped")
+
+class ImageCache:
+    """
+    Content-addressed store of generated images with size-capped LRU eviction.
+
+    Files are named after the hash of every setting that determines the output,
+    and an index table records their size and last access so the least recently
+    used images can be removed once the store exceeds its budget. Methods may be
+    called from executor threads, so index and byte count updates hold a lock.
+    """
+
+    def __init__(self, db_path: pathlib.Path, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.lock = threading.RLock()  # Reentrant: put -> evict -> _delete
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS image_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_image_cache_access ON image_cache (last_access)')
+        self.total_bytes = self.conn.execute('SELECT COALESCE(SUM(size_bytes), 0) FROM image_cache').fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, prompt: str, negative_prompt: Optional[str], num_inference_steps: int,
+                 guidance_scale: float, seed: int, width: int, height: int, image_format: str, quality: int) -> str:
+        """Hash the settings that fully determine a generated image file."""
+        settings = [model, prompt, negative_prompt or "", num_inference_steps, guidance_scale, seed, width, height,
+                    image_format, quality]
+        return hashlib.sha256(json.dumps(settings).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the path of a cached image and mark it as recently used."""
+        with self.lock:
+            row = self.conn.execute('SELECT filename, size_bytes FROM image_cache WHERE cache_key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            path = os.path.join(self.directory, row[0])
+            with self.conn:
+                if not os.path.exists(path):
+                    self.conn.execute('DELETE FROM image_cache WHERE cache_key = ?', (key,))
+                    self.total_bytes -= row[1]
+                    return None
+                self.conn.execute('UPDATE image_cache SET last_access = ? WHERE cache_key = ?', (time.time(), key))
+            return path
+
+    def put(self, key: str, image: bytes, extension: str) -> str:
+        """Store encoded image bytes under their key, evicting old entries if over budget."""
+        filename = f"{key}.{extension}"
+        path = os.path.join(self.directory, filename)
+        # Held while writing too, so garbage collection never sees the file before its index row
+        with self.lock:
+            with open(path, 'wb') as f:
+                f.write(image)
+            size = os.path.getsize(path)
+            now = time.time()
+            with self.conn:
+                previous = self.conn.execute('SELECT size_bytes FROM image_cache WHERE cache_key = ?', (key,)).fetchone()
+                self.conn.execute('''
+                    INSERT OR REPLACE INTO image_cache (cache_key, filename, size_bytes, created_at, last_access)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (key, filename, size, now, now))
+            self.total_bytes += size - (previous[0] if previous else 0)
+            self.evict()
+            return path
+
+    def _delete(self, rows):
+        with self.lock, self.conn:
+            for key, filename, size in rows:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except FileNotFoundError:
+                    pass
+                self.conn.execute('DELETE FROM image_cache WHERE cache_key = ?', (key,))
+                self.total_bytes -= size
+
+    def evict(self):
+        """Remove least recently used images until the store fits its budget."""
+        with self.lock:
+            if self.total_bytes <= self.max_bytes:
+                return
+            victims, freed = [], 0
+            cursor = self.conn.execute('SELECT cache_key, filename, size_bytes FROM image_cache ORDER BY last_access')
+            for row in cursor:
+                if self.total_bytes - freed <= self.max_bytes:
+                    break
+                victims.append(row)
+                freed += row[2]
+            self._delete(victims)
+
+    def collect_garbage(self, max_age_days: int, legacy_directory: str) -> int:
+        """Delete images unused for ``max_age_days``, orphaned cache files and old uncached PNGs.
+
+        Returns:
+            int: The number of files removed.
+        """
+        cutoff = time.time() - max_age_days * 86400
+        with self.lock:
+            stale = self.conn.execute(
+                'SELECT cache_key, filename, size_bytes FROM image_cache WHERE last_access < ?', (cutoff,)
+            ).fetchall()
+            self._delete(stale)
+            removed = len(stale)
+
+            indexed = {row[0] for row in self.conn.execute('SELECT filename FROM image_cache')}
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name not in indexed:
+                    os.remove(entry.path)
+                    removed += 1
+        # Images saved before the cache existed were never cleaned up
+        for entry in os.scandir(legacy_directory):
+            if entry.is_file() and entry.name.endswith('.png') and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        return removed
+
+class EtaPredictor:
+    """
+    Predicts generation times from recorded durations.
+
+    Keeps the most recent per-image durations for each quality tier, and model
+    load times under "load", and predicts with their median so that a single
+    slow outlier does not skew queue estimates. Falls back to rough defaults
+    until history exists.
+    """
+
+    HISTORY = 50
+    DEFAULT_SECONDS = {'draft': 20.0, 'standard': 60.0, 'high': 180.0, 'load': 120.0}
+
+    def __init__(self):
+        self.samples = {name: deque(maxlen=self.HISTORY) for name in self.DEFAULT_SECONDS}
+
+    def record(self, name: str, seconds: float):
+        if name in self.samples:
+            self.samples[name].append(seconds)
+
+    def predict(self, name: str) -> float:
+        """Return the predicted seconds for one image of a tier, or for a model load."""
+        samples = sorted(self.samples[name])
+        if not samples:
+            return self.DEFAULT_SECONDS[name]
+        return samples[len(samples) // 2]
+
+class ImageJob:
+    """
+    A queued image generation request.
+
+    ``recipients`` holds the interaction of every user waiting for this image:
+    the original requester first, then anyone who sent an identical request
+    while it was still in flight.
+    """
+
+    def __init__(self, interaction: discord.Interaction, prompt: str, negative_prompt: Optional[str], tier: str,
+                 guidance_scale: float, seed: int, image_format: str, quality: int, priority: int):
+        self.job_id = uuid.uuid4().hex[:8]
+        self.recipients = [interaction]
+        self.user_id = interaction.user.id
+        self.username = interaction.user.name
+        self.guild_id = interaction.guild.id if interaction.guild else None
+        self.channel_id = interaction.channel.id if interaction.guild else None
+        self.prompt = prompt
+        self.negative_prompt = negative_prompt
+        self.tier = tier
+        self.num_inference_steps = QUALITY_TIERS[tier]['num_inference_steps']
+        self.guidance_scale = guidance_scale
+        self.width = QUALITY_TIERS[tier]['width']
+        self.height = QUALITY_TIERS[tier]['height']
+        self.seed = seed
+        self.image_format = image_format
+        self.quality = quality
+        self.priority = priority
+        self.cache_key = None
+        self.inflight_key = None
+        self.cancelled = False
+        self.last_position = None
+
+    def is_expired(self) -> bool:
+        """Check whether every recipient's interaction token is too old to update its status message."""
+        newest = max(recipient.created_at for recipient in self.recipients)
+        return (discord.utils.utcnow() - newest).total_seconds() > INTERACTION_LIFETIME_SECONDS
+
+    @property
+    def batch_key(self):
+        """Jobs with equal keys can share one pipeline call."""
+        return (self.num_inference_steps, self.guidance_scale, self.width, self.height)
+
+class ImageQueue:
+    """
+    Priority queue of image jobs with per-user fairness.
+
+    Jobs are grouped by priority tier, and within a tier each user has their own
+    FIFO. Users are served round-robin, so one user queueing several prompts
+    cannot starve everyone else.
+    """
+
+    def __init__(self):
+        self.tiers = {}  # priority: OrderedDict(user_id: deque of jobs)
+        self.not_empty = asyncio.Event()
+        self.job_added = asyncio.Event()
+
+    def __len__(self):
+        return sum(len(jobs) for users in self.tiers.values() for jobs in users.values())
+
+    def __contains__(self, job: ImageJob):
+        return job in self.tiers.get(job.priority, {}).get(job.user_id, ())
+
+    def put(self, job: ImageJob):
+        users = self.tiers.setdefault(job.priority, OrderedDict())
+        users.setdefault(job.user_id, deque()).append(job)
+        self.not_empty.set()
+        self.job_added.set()
+
+    def pop(self) -> Optional[ImageJob]:
+        """Take the next job: highest tier first, then the next user in rotation."""
+        for priority in sorted(self.tiers):
+            users = self.tiers[priority]
+            if not users:
+                continue
+            user_id, jobs = next(iter(users.items()))
+            job = jobs.popleft()
+            if jobs:
+                users.move_to_end(user_id)
+            else:
+                del users[user_id]
+            if not len(self):
+                self.not_empty.clear()
+            return job
+        self.not_empty.clear()
+        return None
+
+    def remove(self, job: ImageJob) -> bool:
+        """Remove a waiting job. Returns False if it is no longer queued."""
+        users = self.tiers.get(job.priority, {})
+        jobs = users.get(job.user_id)
+        if not jobs or job not in jobs:
+            return False
+        jobs.remove(job)
+        if not jobs:
+            del users[job.user_id]
+        if not len(self):
+            self.not_empty.clear()
+        return True
+
+    def jobs_in_order(self):
+        """Return waiting jobs in the order ``pop`` will serve them."""
+        ordered = []
+        for priority in sorted(self.tiers):
+            user_jobs = list(self.tiers[priority].values())
+            depth = max((len(jobs) for jobs in user_jobs), default=0)
+            for index in range(depth):
+                ordered.extend(jobs[index] for jobs in user_jobs if index < len(jobs))
+        return ordered
+
+    def take_matching(self, batch_key, limit: int):
+        """Remove and return up to ``limit`` waiting jobs with the given batch key, in serving order."""
+        taken = []
+        for job in self.jobs_in_order():
+            if len(taken) >= limit:
+                break
+            if job.batch_key == batch_key and self.remove(job):
+                taken.append(job)
+        return taken
+
+    def user_jobs(self, user_id: int):
+        """Return every waiting job for a user."""
+        return [job for users in self.tiers.values() for job in users.get(user_id, ())]
+
+class CancelJobView(discord.ui.View):
+    """Attaches a cancel button to one requester's status message for a queued job."""
+
+    def __init__(self, cog, job: ImageJob, owner_id: int):
+        super().__init__(timeout=INTERACTION_LIFETIME_SECONDS)
+        self.cog = cog
+        self.job = job
+        self.owner_id = owner_id
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.red)
+    async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message("Only the requester can cancel this image.", ephemeral=True)
+            return
+        if self.cog.cancel_job(self.job, self.owner_id):
+            await interaction.response.edit_message(content="🚫 Image generation cancelled.", view=None)
+        else:
+            await interaction.response.send_message("This image is already being generated.", ephemeral=True)
+
 class ImageGenerator(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.model_path = "stabilityai/stable-diffusion-3-medium-diffusers"
-        self.model_loaded = False
-        self.semaphore = Semaphore(2)
-        self.pipe = None
+        # The pipeline lives in a worker process started on first use and stopped when idle
+        self.worker = ImageWorkerProcess(self.model_path)
+        self.generation_lock = asyncio.Lock()  # Held by each batch, and by benchmarks to pause generation
+        self.warming_up = False
+        self.last_used = time.monotonic()
+
+        # Generation queue served by a single dedicated worker
+        self.queue = ImageQueue()
+        self.MAX_JOBS_PER_USER = 3
+        self.current_batch = []
+        self.inflight = {}  # inflight_key: queued or running ImageJob, for coalescing identical requests
+        self.current_started = 0.0
+        self.predictor = EtaPredictor()
+        self.recent_images = deque()  # (finished_at, image_count) for throughput reporting
 
         self.db_path = pathlib.Path('./imagegenerator.db')
         self.setup_database()
+        self.guild_formats = self.load_guild_formats()  # guild_id: (format, quality)
+        self.load_duration_history()
+        self.cache = ImageCache(self.db_path, IMAGE_CACHE_DIRECTORY, IMAGE_CACHE_MAX_MB * 1024 * 1024)
+        self.collect_garbage.start()
+        self.unload_idle_model.start()
+        self.watch_worker_memory.start()
+
+        self.worker_task = asyncio.create_task(self._worker())
 
-        asyncio.create_task(self.load_model())
+    async def cog_unload(self):
+        """Stop the generation worker, its process and background maintenance."""
+        self.worker_task.cancel()
+        self.collect_garbage.cancel()
+        self.unload_idle_model.cancel()
+        self.watch_worker_memory.cancel()
+        await self.worker.stop()
+
+    @tasks.loop(minutes=1)
+    async def unload_idle_model(self):
+        """Stop the worker process once it has been unused for IMAGE_IDLE_UNLOAD_MINUTES."""
+        if not self.worker.is_ready() or IMAGE_IDLE_UNLOAD_MINUTES <= 0 or self.current_batch or len(self.queue):
+            return
+        if time.monotonic() - self.last_used < IMAGE_IDLE_UNLOAD_MINUTES * 60:
+            return
+        await self.worker.stop()
+        logger.info("Stable Diffusion model unloaded after idle period.")
+        self.log_event("MODEL_UNLOAD", f"Model unloaded after {IMAGE_IDLE_UNLOAD_MINUTES:g} idle minutes")
+
+    @tasks.loop(hours=6)
+    async def collect_garbage(self):
+        """Periodically remove old images from disk."""
+        removed = await asyncio.get_event_loop().run_in_executor(
+            None, self.cache.collect_garbage, IMAGE_MAX_AGE_DAYS, IMAGE_SAVE_DIRECTORY
+        )
+        if removed:
+            logger.info(f"Image garbage collection removed {removed} file(s)")
+
+    @tasks.loop(seconds=5)
+    async def watch_worker_memory(self):
+        """Kill the worker if it exceeds IMAGE_WORKER_MAX_MEMORY_MB; the next batch restarts it."""
+        memory_mb = self.worker.memory_mb()
+        if memory_mb > IMAGE_WORKER_MAX_MEMORY_MB:
+            logger.warning(f"Image worker using {memory_mb:.0f} MB, over the {IMAGE_WORKER_MAX_MEMORY_MB} MB limit")
+            self.log_event("WORKER_KILLED", f"Image worker exceeded memory limit ({memory_mb:.0f} MB)")
+            await self.worker.kill(f"The image worker exceeded its {IMAGE_WORKER_MAX_MEMORY_MB} MB memory limit.")
 
     def setup_database(self):
         conn = sqlite3.connect(str(self.db_path))
@@ -58,114 +592,562 @@ class ImageGenerator(commands.Cog):
                         timestamp TEXT NOT NULL
                     )
                 ''')
+
+                # Generation timing columns were added after the logs table
+                for column in ('tier TEXT', 'duration_seconds REAL', 'batch_size INTEGER'):
+                    try:
+                        conn.execute(f'ALTER TABLE logs ADD COLUMN {column}')
+                    except sqlite3.OperationalError:
+                        pass  # Column already exists
+
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS image_guild_settings (
+                        guild_id INTEGER PRIMARY KEY,
+                        image_format TEXT NOT NULL,
+                        quality INTEGER NOT NULL
+                    )
+                ''')
             logger.info("Database setup completed.")
         finally:
             conn.close()
 
-    def log_event(self, log_type, message, guild_id=None, channel_id=None, user_id=None, username=None):
+    def load_guild_formats(self):
+        """Load every guild's output format into memory."""
+        conn = sqlite3.connect(str(self.db_path))
+        try:
+            rows = conn.execute('SELECT guild_id, image_format, quality FROM image_guild_settings').fetchall()
+        finally:
+            conn.close()
+        return {guild_id: (image_format, quality) for guild_id, image_format, quality in rows}
+
+    def get_output_format(self, guild_id: Optional[int]):
+        """Return the (format, quality) used for images in a guild; PNG by default."""
+        return self.guild_formats.get(guild_id, ('png', IMAGE_FORMATS['png'][1]))
+
+    def load_duration_history(self):
+        """Seed the ETA predictor with the durations recorded in the image log."""
+        conn = sqlite3.connect(str(self.db_path))
+        try:
+            rows = conn.execute('''
+                SELECT log_type, tier, duration_seconds, batch_size FROM logs
+                WHERE log_type IN ('IMAGE_GENERATION_SUCCESS', 'MODEL_LOAD') AND duration_seconds IS NOT NULL
+                ORDER BY id DESC LIMIT 1000
+            ''').fetchall()
+        finally:
+            conn.close()
+        for log_type, tier, duration, batch_size in reversed(rows):
+            name = 'load' if log_type == 'MODEL_LOAD' else tier
+            self.predictor.record(name, duration / (batch_size or 1))
+
+    def log_event(self, log_type, message, guild_id=None, channel_id=None, user_id=None, username=None,
+                  tier=None, duration=None, batch_size=None):
         conn = sqlite3.connect(str(self.db_path))
         timestamp = datetime.now().isoformat()
         with conn:
             conn.execute('''
-                INSERT INTO logs (log_type, log_message, guild_id, channel_id, user_id, username, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (log_type, message, guild_id, channel_id, user_id, username, timestamp))
+                INSERT INTO logs (log_type, log_message, guild_id, channel_id, user_id, username, timestamp,
+                                  tier, duration_seconds, batch_size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (log_type, message, guild_id, channel_id, user_id, username, timestamp, tier, duration, batch_size))
         conn.close()
         logger.info(f"Logged event: {log_type} - {message}")
 
     async def load_model(self):
+        """Start the worker process if needed, marking the queue as warming up while it loads.
+
+        Raises:
+            ImageWorkerError: If the worker could not load the model.
+        """
+        if self.worker.is_ready():
+            return
+        self.warming_up = True
+        self._publish_positions(force=True)
+        started = time.monotonic()
         try:
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            logger.info(f"Loading Stable Diffusion model from {self.model_path} on {device}...")
-            
-            # Add more detailed logging about system state
-            logger.info(f"CUDA available: {torch.cuda.is_available()}")
-            if torch.cuda.is_available():
-                logger.info(f"CUDA device: {torch.cuda.get_device_name(0)}")
-                logger.info(f"CUDA memory allocated: {torch.cuda.memory_allocated(0)}")
-            
-            self.pipe = StableDiffusion3Pipeline.from_pretrained(
-                self.model_path,
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                use_safetensors=True,
-                variant="fp16" if torch.cuda.is_available() else None,
-                token=HUGGINGFACE_TOKEN
-            ).to(device)
-
-            # Enable memory efficient attention if using CUDA
-            if torch.cuda.is_available():
-                self.pipe.enable_attention_slicing()
-                self.pipe.enable_vae_slicing()
-            
-            self.model_loaded = True
+            await self.worker.start(IMAGE_WORKER_LOAD_TIMEOUT)
+            duration = time.monotonic() - started
+            self.predictor.record('load', duration)
             logger.info("Stable Diffusion model loaded successfully.")
-            self.log_event("MODEL_LOAD", f"Stable Diffusion model loaded on device: {device}")
-        except Exception as e:
+            self.log_event("MODEL_LOAD", f"Stable Diffusion model loaded on device: {self.worker.ready.result()}", duration=duration)
+        except ImageWorkerError as e:
             logger.error(f"Failed to load Stable Diffusion model: {str(e)}")
-            logger.exception("Detailed error traceback:")  # This will log the full traceback
             self.log_event("MODEL_LOAD_FAILURE", f"Failed to load Stable Diffusion model: {str(e)}")
-            self.model_loaded = False  # Ensure this is set to False on failure
+            raise
+        finally:
+            self.warming_up = False
+            self._publish_positions(force=True)
+
+    def _priority_for(self, interaction: discord.Interaction) -> int:
+        """Map the requester to a priority tier (see PRIORITY_NAMES)."""
+        permissions = getattr(interaction.user, 'guild_permissions', None)
+        if permissions and (permissions.administrator or permissions.manage_guild):
+            return 0
+        if getattr(interaction.user, 'premium_since', None):
+            return 1
+        return 2
+
+    def _predict_busy_time(self) -> float:
+        """Predict the seconds until the worker can start the next queued job.
+
+        Covers a model load if the worker is not ready, plus what is left of the
+        batch being generated.
+        """
+        remaining = 0.0 if self.worker.is_ready() else self.predictor.predict('load')
+        if self.current_batch:
+            batch_time = sum(self.predictor.predict(job.tier) for job in self.current_batch)
+            remaining += max(0.0, batch_time - (time.monotonic() - self.current_started))
+        return remaining
+
+    def predict_wait(self, priority: int) -> float:
+        """Predict the seconds a new job with the given priority would wait before starting."""
+        ahead = [job for job in self.queue.jobs_in_order() if job.priority <= priority]
+        return self._predict_busy_time() + sum(self.predictor.predict(job.tier) for job in ahead)
+
+    def images_per_minute(self) -> float:
+        """Return generated images per minute over the last ten minutes."""
+        cutoff = time.monotonic() - 600
+        while self.recent_images and self.recent_images[0][0] < cutoff:
+            self.recent_images.popleft()
+        if not self.recent_images:
+            return 0.0
+        window = max(60.0, time.monotonic() - self.recent_images[0][0])
+        return sum(count for _, count in self.recent_images) * 60 / window
+
+    async def _edit_status(self, job: ImageJob, content: str, keep_view: bool = True, preview: Optional[bytes] = None):
+        """Edit the status message of every recipient of a job.
+
+        Args:
+            job: The job whose messages to edit.
+            content: The new message text.
+            keep_view: Keep the Cancel button; final states remove it along with any preview.
+            preview: Optional JPEG bytes to show as the message attachment.
+        """
+        await asyncio.gather(*(
+            self._edit_message(recipient, content, keep_view, preview) for recipient in list(job.recipients)
+        ))
+
+    async def _edit_message(self, interaction: discord.Interaction, content: str, keep_view: bool = True,
+                            preview: Optional[bytes] = None):
+        """Edit one status message, ignoring failures from expired interactions."""
+        kwargs = {'content': content}
+        if not keep_view:
+            kwargs['view'] = None
+            kwargs['attachments'] = []
+        if preview is not None:
+            kwargs['attachments'] = [discord.File(io.BytesIO(preview), filename="preview.jpg")]
+        try:
+            await interaction.edit_original_response(**kwargs)
+        except discord.HTTPException:
+            pass
+
+    async def _send_to_channels(self, job: ImageJob, content: str, image: Optional[bytes] = None):
+        """Post a message once per channel the job's recipients asked from.
+
+        Args:
+            job: The job whose recipients to notify.
+            content: The message text; ``{mentions}`` is replaced with the recipients in that channel.
+            image: Optional encoded image to attach.
+        """
+        by_channel = {}
+        for recipient in job.recipients:
+            by_channel.setdefault(recipient.channel.id, []).append(recipient)
+        for recipients in by_channel.values():
+            mentions = ", ".join(dict.fromkeys(recipient.user.mention for recipient in recipients))
+            kwargs = {}
+            if image is not None:
+                extension = IMAGE_FORMATS[job.image_format][0]
+                kwargs['file'] = discord.File(io.BytesIO(image), filename=f"{job.job_id}.{extension}")
+            try:
+                await recipients[0].channel.send(content.replace("{mentions}", mentions), **kwargs)
+            except discord.HTTPException as e:
+                logger.warning(f"Could not post to channel {recipients[0].channel.id}: {e}")
+
+    def _progress_reporter(self, batch):
+        """Build a progress handler that edits every job in a batch, throttled to IMAGE_PROGRESS_INTERVAL.
+
+        The handler's ``edits`` list holds the edit tasks so they can be awaited
+        before the final status is written.
+        """
+        last_edit = 0.0
+        edits = []
+
+        def report(step: int, total: int, preview: Optional[bytes]):
+            nonlocal last_edit
+            now = time.monotonic()
+            if step >= total or (now - last_edit < IMAGE_PROGRESS_INTERVAL and preview is None):
+                return
+            last_edit = now
+            elapsed = now - self.current_started
+            remaining = elapsed / step * (total - step)
+            content = (
+                f"🎨 Generating your image... step {step}/{total} ({step * 100 // total}%), "
+                f"{elapsed:.0f}s elapsed, about {remaining:.0f}s left."
+            )
+            edits.extend(asyncio.create_task(self._edit_status(job, content, preview=preview)) for job in batch)
+
+        report.edits = edits
+        return report
+
+    def _publish_positions(self, force: bool = False):
+        """Update the status message of every waiting job whose position changed.
+
+        Args:
+            force: Also update jobs whose position is unchanged, e.g. when the model state changes.
+        """
+        wait = self._predict_busy_time()
+        for position, job in enumerate(self.queue.jobs_in_order(), start=1):
+            eta = int(wait)
+            wait += self.predictor.predict(job.tier)
+            if job.last_position == position and not force:
+                continue
+            job.last_position = position
+            content = (
+                f"⏳ Queued ({PRIORITY_NAMES[job.priority]}) - position {position} of {len(self.queue)}, "
+                f"starting in about {eta // 60}m {eta % 60}s."
+            )
+            if self.warming_up:
+                content += " 🔥 The image model is warming up."
+            asyncio.create_task(self._edit_status(job, content))
+
+    def cancel_job(self, job: ImageJob, user_id: int):
+        """Withdraw a user from a queued job; the job is cancelled once nobody is waiting for it.
+
+        Returns:
+            list: The user's withdrawn interactions, empty if the job has already started.
+        """
+        if job not in self.queue:
+            return []
+        withdrawn = [recipient for recipient in job.recipients if recipient.user.id == user_id]
+        job.recipients = [recipient for recipient in job.recipients if recipient.user.id != user_id]
+        if not job.recipients:
+            self.queue.remove(job)
+            job.cancelled = True
+            self._finish(job)
+            self.log_event("IMAGE_GENERATION_CANCELLED", f"Job {job.job_id} cancelled", job.guild_id, job.channel_id, job.user_id, job.username)
+            self._publish_positions()
+        return withdrawn
+
+    def _finish(self, job: ImageJob):
+        """Stop routing identical requests to a job that is done, failed or dropped."""
+        if self.inflight.get(job.inflight_key) is job:
+            del self.inflight[job.inflight_key]
+
+    def _is_runnable(self, job: ImageJob) -> bool:
+        """Drop cancelled jobs and jobs whose interactions have all expired."""
+        if job.cancelled:
+            return False
+        if job.is_expired():
+            self._finish(job)
+            self.log_event("IMAGE_GENERATION_EXPIRED", f"Dropped job {job.job_id}: interaction expired", job.guild_id, job.channel_id, job.user_id, job.username)
+            return False
+        return True
+
+    async def _collect_batch(self, first: ImageJob):
+        """Gather queued jobs compatible with ``first``, waiting briefly for more to arrive."""
+        batch = [first]
+        deadline = time.monotonic() + IMAGE_BATCH_WINDOW
+        while True:
+            taken = self.queue.take_matching(first.batch_key, IMAGE_BATCH_SIZE - len(batch))
+            batch.extend(job for job in taken if self._is_runnable(job))
+            remaining = deadline - time.monotonic()
+            if len(batch) >= IMAGE_BATCH_SIZE or remaining <= 0:
+                return batch
+            self.queue.job_added.clear()
+            try:
+                await asyncio.wait_for(self.queue.job_added.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        """Serve queued jobs in batches, dropping cancelled and expired ones."""
+        while True:
+            await self.queue.not_empty.wait()
+            job = self.queue.pop()
+            if job is None or not self._is_runnable(job):
+                continue
+
+            batch = [job]
+            try:
+                batch = await self._collect_batch(job)
+                async with self.generation_lock:
+                    await self._serve_batch(batch)
+            except Exception:
+                # Never let one bad batch stop the only worker task
+                logger.exception("Unexpected error in the image worker loop")
+                for job in batch:
+                    self._finish(job)
+
+    async def _serve_batch(self, batch):
+        """Run one batch and report a failure to every requester in it."""
+        self.current_batch = batch
+        self.current_started = time.monotonic()
+        self._publish_positions()
+        try:
+            await self._run_batch(batch)
+        except Exception as e:
+            logger.error(f"Error during image generation: {str(e)}")
+            for job in batch:
+                self.log_event("IMAGE_GENERATION_ERROR", f"Error during image generation: {str(e)}", job.guild_id, job.channel_id, job.user_id, job.username)
+                try:
+                    await self._send_to_channels(job, f"❌ {{mentions}}, an error occurred while generating the image: {str(e)}")
+                    await self._edit_status(job, "❌ Image generation failed.", keep_view=False)
+                except discord.HTTPException as report_error:
+                    logger.warning(f"Could not report image generation error: {report_error}")
+        finally:
+            self.current_batch = []
+            for job in batch:
+                self._finish(job)
+
+    async def _run_batch(self, batch):
+        """Generate the images for a batch of compatible jobs and deliver each to its requester."""
+        first = batch[0]
+        if not self.worker.is_ready():
+            for job in batch:
+                await self._edit_status(job, "🔥 Warming up the image model, your image will start shortly...", keep_view=False)
+            await self.load_model()
+            # Loading can take minutes, so only time the generation itself
+            self.current_started = time.monotonic()
+
+        for job in batch:
+            await self._edit_status(job, "🎨 Generating your image...", keep_view=False)
+            logger.info(f"Generating image for user {job.username} with prompt: {job.prompt}")
+            self.log_event("IMAGE_GENERATION_STARTED", f"Image generation started for prompt: {job.prompt} (batch of {len(batch)})", job.guild_id, job.channel_id, job.user_id, job.username)
+
+        progress = self._progress_reporter(batch)
+        try:
+            reply = await self.worker.request({
+                'type': 'generate',
+                'batch_id': first.job_id,
+                'settings': {
+                    'num_inference_steps': first.num_inference_steps,
+                    'guidance_scale': first.guidance_scale,
+                    'width': first.width,
+                    'height': first.height
+                },
+                'jobs': [
+                    {'prompt': job.prompt, 'negative_prompt': job.negative_prompt, 'seed': job.seed,
+                     'format': job.image_format, 'quality': job.quality}
+                    for job in batch
+                ],
+                'preview_every': IMAGE_PREVIEW_EVERY
+            }, timeout=IMAGE_WORKER_BATCH_TIMEOUT, on_progress=progress)
+        finally:
+            # Let in-flight progress edits land before the final status overwrites them
+            await asyncio.gather(*progress.edits)
+        images = reply['images']
+        duration = time.monotonic() - self.current_started
+        self.last_used = time.monotonic()
+        self.recent_images.append((time.monotonic(), len(images)))
+        logger.info(f"Generated {len(images)} image(s) in {duration:.1f}s, {self.images_per_minute():.2f} images/min")
+
+        for job, image in zip(batch, images):
+            try:
+                await self._deliver(job, image, duration, len(images))
+            except Exception as e:
+                logger.error(f"Failed to deliver image for job {job.job_id}: {str(e)}")
+                self.log_event("IMAGE_SEND_ERROR", f"Failed to deliver image: {str(e)}", job.guild_id, job.channel_id, job.user_id, job.username)
+
+    async def _deliver(self, job: ImageJob, image: bytes, duration: float, batch_size: int):
+        """Upload one encoded image straight from memory, then archive it to the cache in the background.
+
+        Args:
+            job: The finished job.
+            image: The encoded image.
+            duration: Seconds the whole batch took to generate.
+            batch_size: Number of images generated in the batch.
+        """
+        # Recipients are fixed from here on; identical requests arriving during the
+        # upload must start a new job or hit the cache rather than join this one
+        self._finish(job)
+        logger.info(f"Image generated ({len(image)} bytes, {job.image_format})")
+        self.predictor.record(job.tier, duration / batch_size)
+        self.log_event("IMAGE_GENERATION_SUCCESS", f"Image generated: {len(image)} bytes as {job.image_format}", job.guild_id, job.channel_id, job.user_id, job.username,
+                       tier=job.tier, duration=duration, batch_size=batch_size)
+
+        await self._send_to_channels(job, f"✅ {{mentions}}, your image has been generated! (seed {job.seed})", image)
+        await self._edit_status(job, f"✅ Done in {duration:.0f}s.", keep_view=False)
+        logger.info(f"Sent generated image to {len(job.recipients)} user(s)")
+        self.log_event("IMAGE_SENT", f"Sent image {job.job_id} to {len(job.recipients)} user(s)", job.guild_id, job.channel_id, job.user_id, job.username)
+
+        if IMAGE_ARCHIVE:
+            asyncio.create_task(self._archive(job, image, IMAGE_FORMATS[job.image_format][0]))
+
+    async def _archive(self, job: ImageJob, image: bytes, extension: str):
+        """Write an image to the cache without blocking the event loop."""
+        try:
+            path = await asyncio.get_event_loop().run_in_executor(None, self.cache.put, job.cache_key, image, extension)
+            logger.info(f"Image archived to {path}")
+        except OSError as e:
+            logger.error(f"Failed to archive image {job.job_id}: {str(e)}")
 
     @discord.app_commands.command(
         name="generate_image",
         description="Generate an image based on your prompt using the Stable Diffusion model."
     )
+    @app_commands.describe(
+        tier="draft: 512px, 12 steps (fast). standard: 768px, 28 steps. high: 1024px, 50 steps (slow)."
+    )
+    @app_commands.choices(tier=[app_commands.Choice(name=name, value=name) for name in QUALITY_TIERS])
     async def generate_image(
         self,
         interaction: discord.Interaction,
         prompt: str,
-        num_inference_steps: Optional[int] = 50,
-        guidance_scale: Optional[float] = 7.5
+        tier: Optional[str] = 'standard',
+        negative_prompt: Optional[str] = None,
+        guidance_scale: Optional[float] = 7.5,
+        seed: Optional[int] = None
     ):
-        if not self.model_loaded or self.pipe is None:
-            await interaction.response.send_message("❌ The image generation model is still loading. Please try again in a few seconds.")
-            return
-
         # Input validation
         try:
-            num_inference_steps = int(num_inference_steps)
             guidance_scale = float(guidance_scale)
         except ValueError:
             await interaction.response.send_message("❌ Invalid parameter values provided.")
             return
 
-        # Only send the "generating" message if all checks pass
-        await interaction.response.send_message("⏳ Generating your image... This might take a while.")
+        # Without an explicit seed the result is random, so only seeded requests can hit the cache
+        explicit_seed = seed is not None
+        if not explicit_seed:
+            seed = random.randint(0, 2**32 - 1)
 
-        guild_id = interaction.guild.id if interaction.guild else None
-        channel_id = interaction.channel.id if interaction.guild else None
-        user_id = interaction.user.id
-        username = interaction.user.name
+        image_format, quality = self.get_output_format(interaction.guild_id)
+        job = ImageJob(interaction, prompt, negative_prompt, tier, guidance_scale, seed, image_format, quality,
+                       self._priority_for(interaction))
+        job.cache_key = ImageCache.make_key(self.model_path, prompt, negative_prompt, job.num_inference_steps,
+                                            guidance_scale, seed, job.width, job.height, image_format, quality)
+        # Unseeded requests with identical settings are interchangeable, so they share one key
+        job.inflight_key = ImageCache.make_key(self.model_path, prompt, negative_prompt, job.num_inference_steps,
+                                               guidance_scale, seed if explicit_seed else None, job.width,
+                                               job.height, image_format, quality)
 
-        logger.info(f"Received image generation request from {username} (ID: {user_id}) with prompt: {prompt}")
-        self.log_event("COMMAND_INVOKED", f"User {username} invoked /generate_image with prompt: {prompt}", guild_id, channel_id, user_id, username)
+        logger.info(f"Received image generation request from {job.username} (ID: {job.user_id}) with prompt: {prompt}")
+        self.log_event("COMMAND_INVOKED", f"User {job.username} invoked /generate_image with prompt: {prompt}", job.guild_id, job.channel_id, job.user_id, job.username)
 
-        try:
-            async with self.semaphore:
-                logger.info(f"Generating image for user {username} with prompt: {prompt}")
-                self.log_event("IMAGE_GENERATION_STARTED", f"Image generation started for prompt: {prompt}", guild_id, channel_id, user_id, username)
+        cached_path = self.cache.get(job.cache_key) if explicit_seed else None
+        if cached_path:
+            await interaction.response.send_message(f"✅ {interaction.user.mention}, here is your image! (seed {seed}, cached)", file=discord.File(cached_path))
+            self.log_event("IMAGE_CACHE_HIT", f"Served cached image: {cached_path}", job.guild_id, job.channel_id, job.user_id, job.username)
+            return
 
-                image = await asyncio.get_event_loop().run_in_executor(
-                    None,
-                    lambda: self.pipe(prompt, num_inference_steps=num_inference_steps, guidance_scale=guidance_scale).images[0]
-                )
+        existing = self.inflight.get(job.inflight_key)
+        if existing is not None:
+            existing.recipients.append(interaction)
+            kwargs = {'view': CancelJobView(self, existing, interaction.user.id)} if existing in self.queue else {}
+            await interaction.response.send_message(
+                "🔗 An identical image is already in progress. You'll get the same result when it's ready.", **kwargs
+            )
+            self.log_event("IMAGE_REQUEST_COALESCED", f"Attached to in-flight job {existing.job_id}", job.guild_id, job.channel_id, job.user_id, job.username)
+            return
 
-                # Generate a unique filename
-                unique_filename = f"{uuid.uuid4()}.png"
-                image_save_path = os.path.join(IMAGE_SAVE_DIRECTORY, unique_filename)
-                image.save(image_save_path, format="PNG")
+        if len(self.queue.user_jobs(interaction.user.id)) >= self.MAX_JOBS_PER_USER:
+            await interaction.response.send_message(
+                f"❌ You already have {self.MAX_JOBS_PER_USER} images queued. Please wait for them to finish.",
+                ephemeral=True
+            )
+            return
 
-                logger.info(f"Image generated and saved to {image_save_path}")
-                self.log_event("IMAGE_GENERATION_SUCCESS", f"Image generated and saved to {image_save_path}", guild_id, channel_id, user_id, username)
+        # Admission control: reject up front rather than let the interaction expire in the queue
+        predicted_wait = self.predict_wait(job.priority)
+        if predicted_wait > IMAGE_MAX_QUEUE_WAIT:
+            suggestion = " or use the draft tier" if tier != 'draft' else ""
+            await interaction.response.send_message(
+                f"❌ The image queue is too long right now (about {int(predicted_wait) // 60}m wait). "
+                f"Please try again later{suggestion}.",
+                ephemeral=True
+            )
+            self.log_event("IMAGE_REQUEST_REJECTED", f"Predicted wait {predicted_wait:.0f}s exceeds limit", job.guild_id, job.channel_id, job.user_id, job.username, tier=tier)
+            return
 
-            await interaction.channel.send(f"✅ Your image has been generated!", file=discord.File(image_save_path))
-            logger.info(f"Sent generated image to user {username}")
-            self.log_event("IMAGE_SENT", f"Sent image to user: {image_save_path}", guild_id, channel_id, user_id, username)
+        # Only send the queued message if all checks pass
+        await interaction.response.send_message("⏳ Queued...", view=CancelJobView(self, job, interaction.user.id))
+        self.queue.put(job)
+        self.inflight[job.inflight_key] = job
+        self._publish_positions()
 
-        except Exception as e:
-            logger.error(f"Error during image generation: {str(e)}")
-            self.log_event("IMAGE_GENERATION_ERROR", f"Error during image generation: {str(e)}", guild_id, channel_id, user_id, username)
-            await interaction.channel.send(f"❌ An error occurred while generating the image: {str(e)}")
+    @discord.app_commands.command(name="cancel_image", description="Cancel your queued image generation requests.")
+    async def cancel_image(self, interaction: discord.Interaction):
+        cancelled = [withdrawn for job in list(self.inflight.values())
+                     for withdrawn in self.cancel_job(job, interaction.user.id)]
+        for withdrawn in cancelled:
+            asyncio.create_task(self._edit_message(withdrawn, "🚫 Image generation cancelled.", keep_view=False))
+        if cancelled:
+            await interaction.response.send_message(f"🚫 Cancelled {len(cancelled)} queued image(s).", ephemeral=True)
+        else:
+            await interaction.response.send_message("You have no queued images.", ephemeral=True)
+
+    @discord.app_commands.command(name="image_format", description="Set the output format and compression for generated images in this server.")
+    @app_commands.describe(
+        image_format="png is lossless, webp and jpeg are much smaller to upload",
+        quality="PNG: compression level 0-9. WebP/JPEG: quality 1-100."
+    )
+    @app_commands.choices(image_format=[app_commands.Choice(name=name, value=name) for name in IMAGE_FORMATS])
+    @app_commands.default_permissions(manage_guild=True)
+    @app_commands.guild_only()
+    async def image_format(self, interaction: discord.Interaction, image_format: str, quality: Optional[int] = None):
+        _, default_quality, min_quality, max_quality = IMAGE_FORMATS[image_format]
+        quality = default_quality if quality is None else quality
+        if not min_quality <= quality <= max_quality:
+            await interaction.response.send_message(
+                f"❌ Quality for {image_format} must be between {min_quality} and {max_quality}.", ephemeral=True
+            )
+            return
+
+        conn = sqlite3.connect(str(self.db_path))
+        with conn:
+            conn.execute('''
+                INSERT INTO image_guild_settings (guild_id, image_format, quality) VALUES (?, ?, ?)
+                ON CONFLICT(guild_id) DO UPDATE SET image_format = excluded.image_format, quality = excluded.quality
+            ''', (interaction.guild_id, image_format, quality))
+        conn.close()
+        self.guild_formats[interaction.guild_id] = (image_format, quality)
+        self.log_event("IMAGE_FORMAT_SET", f"Output format set to {image_format} ({quality})", interaction.guild_id, interaction.channel_id, interaction.user.id, interaction.user.name)
+        await interaction.response.send_message(f"✅ Images in this server will be sent as {image_format} (quality {quality}).", ephemeral=True)
+
+    @discord.app_commands.command(name="image_benchmark", description="Time every inference profile on this machine.")
+    @app_commands.describe(steps="Inference steps per timed image")
+    @app_commands.default_permissions(administrator=True)
+    async def image_benchmark(self, interaction: discord.Interaction, steps: Optional[int] = 8):
+        if self.generation_lock.locked():
+            await interaction.response.send_message("❌ Images are being generated right now. Try again when the queue is idle.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        async with self.generation_lock:
+            # Free the live pipeline so profiles are timed without competing for memory
+            await self.worker.stop()
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, '-m', 'image_worker', self.model_path, '--benchmark', '--steps', str(steps),
+                stdout=asyncio.subprocess.PIPE, cwd=str(PROJECT_ROOT)
+            )
+            try:
+                stdout, _ = await asyncio.wait_for(process.communicate(), timeout=IMAGE_WORKER_LOAD_TIMEOUT * 3)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                await interaction.followup.send("❌ The benchmark timed out.", ephemeral=True)
+                return
+
+        if process.returncode != 0 or not stdout.strip():
+            await interaction.followup.send(f"❌ The benchmark failed (exit code {process.returncode}).", ephemeral=True)
+            return
+
+        results = json.loads(stdout.decode('utf-8').strip().splitlines()[-1])
+        embed = discord.Embed(title="🎨 Image Benchmark", description=f"{steps} steps at 512x512", color=discord.Color.blue())
+        for profile, seconds in results.items():
+            value = f"{seconds:.1f}s per image" if isinstance(seconds, (int, float)) else seconds
+            embed.add_field(name=profile, value=value, inline=False)
+        self.log_event("IMAGE_BENCHMARK", json.dumps(results), interaction.guild_id, interaction.channel_id, interaction.user.id, interaction.user.name)
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    @discord.app_commands.command(name="image_queue", description="Show the image generation queue and throughput.")
+    async def image_queue(self, interaction: discord.Interaction):
+        embed = discord.Embed(title="🎨 Image Queue", color=discord.Color.blue())
+        embed.add_field(name="Waiting", value=str(len(self.queue)), inline=True)
+        embed.add_field(name="Generating", value=str(len(self.current_batch)), inline=True)
+        embed.add_field(name="Throughput", value=f"{self.images_per_minute():.2f} images/min", inline=True)
+        embed.add_field(name="Predicted Wait", value=f"{self.predict_wait(max(PRIORITY_NAMES)):.0f}s", inline=True)
+        for name in QUALITY_TIERS:
+            embed.add_field(name=f"{name.title()} Tier", value=f"~{self.predictor.predict(name):.0f}s per image", inline=True)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
 # Function to set up the cog
 async def setup(bot):
@@ -116,6 +116,41 @@ class AURAcoin(commands.Cog):
             print(f"Database integrity error in update_balance: {e}")
             raise
 
+    def update_balances(self, changes, extra_statements=()):
+        """Applies several balance changes in a single transaction.
+
+        Use this to settle multiplayer rounds with one commit instead of one per player.
+
+        Args:
+            changes: Iterable of (player_id, amount, transaction_type) tuples.
+            extra_statements: Optional (sql, rows) pairs run with executemany in the
+                same transaction, so game records commit or roll back with the payouts.
+
+        Returns:
+            dict: The new balance for each player.
+        """
+        balances = {}
+        rows = []
+        timestamp = datetime.now().isoformat()
+        for player_id, amount, transaction_type in changes:
+            if player_id not in balances:
+                balances[player_id] = self.get_auracoin_balance(player_id)
+            balances[player_id] += amount
+            rows.append((player_id, amount, balances[player_id], transaction_type, timestamp))
+
+        try:
+            with self.conn:
+                self.conn.executemany("""
+                    INSERT INTO auracoin_ledger (player_id, change_amount, balance, transaction_type, timestamp)
+                    VALUES (?, ?, ?, ?, ?)
+                """, rows)
+                for sql, statement_rows in extra_statements:
+                    self.conn.executemany(sql, statement_rows)
+        except sqlite3.IntegrityError as e:
+            print(f"Database integrity error in update_balances: {e}")
+            raise
+        return balances
+
     def log_command_usage(self, interaction, command_name, input_data, output_data):
         """Logs the command usage to the database.
 
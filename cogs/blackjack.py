@@ -9,6 +9,103 @@ from discord import app_commands
 from datetime import datetime
 import asyncio
 
+SUITS = ('Hearts', 'Diamonds', 'Clubs', 'Spades')
+SUIT_SYMBOLS = ('♥️', '♦️', '♣️', '♠️')
+RANKS = ('2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A')
+RANK_VALUES = (2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 11)  # Aces count 11 until that would bust
+
+# Cards are ints 0-51: suit * 13 + rank index. Everything about a card is a table lookup.
+CARD_VALUES = tuple(RANK_VALUES[card % 13] for card in range(52))
+CARD_NAMES = tuple(f"{RANKS[card % 13]} of {SUITS[card // 13]}" for card in range(52))
+CARD_SYMBOLS = tuple(f"{RANKS[card % 13]} {SUIT_SYMBOLS[card // 13]}" for card in range(52))
+
+# House rules, shared with tools/blackjack_sim.py
+DEALER_STANDS_ON = 17
+DEALER_HITS_SOFT_17 = False
+PAYOUT_MULTIPLIERS = {
+    "blackjack": 2.5,  # Pays 3:2
+    "win": 2.0,        # Pays 1:1
+    "push": 1.0,       # Return original bet
+    "lose": 0.0        # Lose bet
+}
+
+
+class Hand:
+    """
+    A blackjack hand that keeps its value up to date as cards are added.
+
+    ``total`` counts every ace as 11 until that would bust; ``soft_aces`` is the
+    number of aces still counted as 11, so adding a card is O(1).
+    """
+
+    __slots__ = ('cards', 'total', 'soft_aces')
+
+    def __init__(self, cards=()):
+        self.cards = []
+        self.total = 0
+        self.soft_aces = 0
+        for card in cards:
+            self.add(card)
+
+    def add(self, card: int):
+        """Add a card and update the running total."""
+        self.cards.append(card)
+        value = CARD_VALUES[card]
+        self.total += value
+        if value == 11:
+            self.soft_aces += 1
+        while self.total > 21 and self.soft_aces:
+            self.total -= 10
+            self.soft_aces -= 1
+
+    def is_soft(self) -> bool:
+        """Return True if an ace is still counted as 11."""
+        return self.soft_aces > 0
+
+    def is_blackjack(self) -> bool:
+        """Return True for 21 with the first two cards."""
+        return len(self.cards) == 2 and self.total == 21
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __iter__(self):
+        return iter(self.cards)
+
+
+class Shoe:
+    """
+    A multi-deck shoe that deals by advancing a position instead of popping.
+
+    The shoe is reshuffled between rounds once ``penetration`` of it has been
+    dealt, like a cut card. If a round runs past the end, the shoe is reshuffled
+    on the spot so dealing never fails.
+    """
+
+    def __init__(self, decks: int = 6, penetration: float = 0.75):
+        self.cards = bytearray(range(52)) * decks
+        self.cut = int(len(self.cards) * penetration)
+        self.position = 0
+        self.shuffle()
+
+    def shuffle(self):
+        """Shuffle every card back into the shoe."""
+        random.shuffle(self.cards)
+        self.position = 0
+
+    def needs_shuffle(self) -> bool:
+        """Return True once the cut card has been reached."""
+        return self.position >= self.cut
+
+    def draw(self) -> int:
+        """Deal the next card."""
+        if self.position >= len(self.cards):
+            self.shuffle()
+        card = self.cards[self.position]
+        self.position += 1
+        return card
+
+
 class BlackjackGame:
     def __init__(self, cog, channel_id):
         self.cog = cog
@@ -16,65 +113,42 @@ class BlackjackGame:
         self.players = set()
         self.players_in_turn = set()
         self.player_hands = {}
-        self.dealer_hand = []
+        self.dealer_hand = Hand()
         self.bets = {}
-        self.deck = self.initialize_deck()
+        self.shoe = cog.get_shoe(channel_id)
         self.game_id = str(uuid.uuid4())
         self.auracoin_cog = cog.bot.get_cog('AURAcoin')
-
-    def initialize_deck(self):
-        suits = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
-        ranks = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-        deck = [{'suit': suit, 'rank': rank} for suit in suits for rank in ranks]
-        random.shuffle(deck)
-        return deck
+        self.settled = False  # Set once the round has been claimed for settlement
 
     def add_player(self, player_id: int):
         """Add a player to the game."""
         self.players.add(player_id)
         self.players_in_turn.add(player_id)
-        self.player_hands[player_id] = []
+        self.player_hands[player_id] = Hand()
 
     def calculate_hand_value(self, hand):
-        """Calculate the total value of a hand, handling Aces optimally."""
-        value = 0
-        aces = 0
-        
-        for card in hand:
-            if card['rank'] == 'A':
-                aces += 1
-            else:
-                if card['rank'] in ['K', 'Q', 'J']:
-                    value += 10
-                else:
-                    value += int(card['rank'])
-        
-        for _ in range(aces):
-            if value + 11 <= 21:
-                value += 11
-            else:
-                value += 1
-        
-        return value
+        """Return the value of a hand, with aces counted optimally."""
+        return hand.total
 
     def format_hand(self, hand):
         """Formats the hand for display."""
-        return ', '.join(f"{card['rank']} of {card['suit']}" for card in hand)
+        return ', '.join(CARD_NAMES[card] for card in hand)
 
     def deal_initial_cards(self):
         """Deal initial cards to all players and dealer."""
+        if self.shoe.needs_shuffle():
+            self.shoe.shuffle()
+
         # Deal two cards to each player
         for player_id in self.players:
-            self.player_hands[player_id] = [self.deck.pop() for _ in range(2)]
+            self.player_hands[player_id] = Hand((self.shoe.draw(), self.shoe.draw()))
         
         # Deal dealer's cards
-        self.dealer_hand = [self.deck.pop() for _ in range(2)]
+        self.dealer_hand = Hand((self.shoe.draw(), self.shoe.draw()))
 
     def hit(self, player_id):
         """Give the player another card."""
-        if len(self.deck) == 0:
-            self.deck = self.initialize_deck()
-        self.player_hands[player_id].append(self.deck.pop())
+        self.player_hands[player_id].add(self.shoe.draw())
 
     def stand(self, player_id):
         """Player chooses to stand."""
@@ -82,10 +156,10 @@ class BlackjackGame:
 
     def play_dealer_hand(self):
         """Play out the dealer's hand according to house rules."""
-        while self.calculate_hand_value(self.dealer_hand) < 17:
-            if len(self.deck) == 0:
-                self.deck = self.initialize_deck()
-            self.dealer_hand.append(self.deck.pop())
+        hand = self.dealer_hand
+        while hand.total < DEALER_STANDS_ON or (
+                DEALER_HITS_SOFT_17 and hand.total == DEALER_STANDS_ON and hand.is_soft()):
+            hand.add(self.shoe.draw())
 
     async def place_bet(self, interaction, player_id, amount):
         """Place a bet for a player."""
@@ -105,13 +179,15 @@ class BlackjackGame:
         return all(player_id in self.bets for player_id in self.players)
 
     def get_winnings_or_loss(self, result, player_id):
-        """Calculate winnings or losses based on game result."""
-        if result == "win":
-            return self.bets[player_id]
-        elif result == "lose":
-            return -self.bets[player_id]
-        else:
-            return 0
+        """Calculate the net winnings (negative for a loss) for a game result."""
+        bet = self.bets.get(player_id, 0)
+        return int(bet * self.get_payout_multiplier(result)) - bet
+
+    def refund_bets(self):
+        """Return every player's stake in one transaction, for rounds that could not be settled."""
+        self.auracoin_cog.update_balances([
+            (player_id, bet, 'blackjack_refund') for player_id, bet in self.bets.items()
+        ])
 
     def determine_results(self, player_id=None):
         """
@@ -129,19 +205,19 @@ class BlackjackGame:
         if hasattr(player_id, 'user'):
             player_id = player_id.user.id
         
-        dealer_value = self.calculate_hand_value(self.dealer_hand)
+        dealer_value = self.dealer_hand.total
         dealer_bust = dealer_value > 21
 
         def get_player_result(pid):
             player_hand = self.player_hands[pid]
-            player_value = self.calculate_hand_value(player_hand)
+            player_value = player_hand.total
             
             # Check for player bust first
             if player_value > 21:
                 return "lose"
             
             # Check for player blackjack (21 with 2 cards)
-            if len(player_hand) == 2 and player_value == 21:
+            if player_hand.is_blackjack():
                 return "blackjack"
             
             # If dealer busts and player hasn't, player wins
@@ -170,39 +246,40 @@ class BlackjackGame:
         """
         Get the payout multiplier for a given result.
         """
-        multipliers = {
-            "blackjack": 2.5,  # Pays 3:2
-            "win": 2.0,        # Pays 1:1
-            "push": 1.0,       # Return original bet
-            "lose": 0.0        # Lose bet
-        }
-        return multipliers.get(result, 0.0)
-
-    def log_blackjack_game(self, player_id, result, bet, winnings_or_loss):
+        return PAYOUT_MULTIPLIERS.get(result, 0.0)
+
+    def settle_round(self):
         """
-        Logs the result of a Blackjack game into the blackjack_game table.
-        
-        Args:
-            player_id: The ID of the player
-            result: The game result (win/lose/push/blackjack)
-            bet: The amount bet
-            winnings_or_loss: The amount won or lost
+        Pay out and record the round for every player in one transaction.
+
+        Results are determined once; the payouts and the blackjack_game rows
+        are committed together through ``AURAcoin.update_balances``, so a
+        round is either fully settled or not at all.
+
+        Returns:
+            Dictionary mapping player IDs to (result, winnings_or_loss) tuples.
         """
+        results = self.determine_results()
         timestamp = datetime.now().isoformat()
-        
-        try:
-            # Use the cog's database connection
-            with self.cog.conn:
-                self.cog.conn.execute('''
-                    INSERT INTO blackjack_game 
-                    (game_id, channel_id, player_id, result, amount_won_lost, bet, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (self.game_id, self.channel_id, player_id, result, winnings_or_loss, bet, timestamp))
-        except sqlite3.IntegrityError as e:
-            print(f"Database integrity error in log_blackjack_game: {e}")
-            print(f"game_id: {self.game_id}, player_id: {player_id}")
-        except Exception as e:
-            print(f"Unexpected error while logging Blackjack game: {e}")
+        settlements = {}
+        changes = []
+        rows = []
+
+        for player_id, result in results.items():
+            bet = self.bets.get(player_id, 0)
+            winnings_or_loss = self.get_winnings_or_loss(result, player_id)
+            payout = bet + winnings_or_loss
+            settlements[player_id] = (result, winnings_or_loss)
+            if payout > 0:
+                changes.append((player_id, payout, 'blackjack_payout'))
+            rows.append((self.game_id, self.channel_id, player_id, result, winnings_or_loss, bet, timestamp))
+
+        self.auracoin_cog.update_balances(changes, extra_statements=[('''
+            INSERT INTO blackjack_game
+            (game_id, channel_id, player_id, result, amount_won_lost, bet, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)])
+        return settlements
 
 class Blackjack(commands.Cog):
     """
@@ -219,6 +296,7 @@ class Blackjack(commands.Cog):
         self.bot = bot
         self.active_games = {}  # {channel_id: BlackjackGame}
         self.game_locks = {}    # {channel_id: asyncio.Lock}
+        self.shoes = {}         # {channel_id: Shoe}, kept between games so penetration carries over
         self._setup_database()
 
     def _setup_database(self):
@@ -246,6 +324,12 @@ class Blackjack(commands.Cog):
         ''')
         self.conn.commit()
 
+    def get_shoe(self, channel_id: int) -> Shoe:
+        """Get or create the shoe for a channel."""
+        if channel_id not in self.shoes:
+            self.shoes[channel_id] = Shoe()
+        return self.shoes[channel_id]
+
     async def get_game_lock(self, channel_id: int) -> asyncio.Lock:
         """Get or create a lock for a specific game channel."""
         if channel_id not in self.game_locks:
@@ -395,7 +479,7 @@ class Blackjack(commands.Cog):
             return
 
         game = self.active_games[key]
-        if user.id not in game.players_in_turn:
+        if game.settled or user.id not in game.players_in_turn:
             await interaction.followup.send("It's not your turn or you've already stood.", ephemeral=True)
             return
 
@@ -444,7 +528,7 @@ class Blackjack(commands.Cog):
             return
 
         game = self.active_games[key]
-        if user.id not in game.players_in_turn:
+        if game.settled or user.id not in game.players_in_turn:
             await interaction.followup.send("It's not your turn or you've already stood.", ephemeral=True)
             return
 
@@ -483,7 +567,7 @@ class Blackjack(commands.Cog):
 
     async def _send_initial_hands(self, interaction: discord.Interaction, game: 'BlackjackGame'):
         """Send initial hand information to players."""
-        dealer_card = game.dealer_hand[0]
+        dealer_card = game.dealer_hand.cards[0]
         embed = discord.Embed(
             title="🎲 The Game Begins! 🎴",
             description=(
@@ -507,10 +591,9 @@ class Blackjack(commands.Cog):
                     f"❌ {user.mention}, I couldn't send your cards! Please enable DMs from server members."
                 )
 
-    def _format_card(self, card: dict) -> str:
+    def _format_card(self, card: int) -> str:
         """Format a card with proper suit symbols."""
-        suits = {'Hearts': '♥️', 'Diamonds': '♦️', 'Clubs': '♣️', 'Spades': '♠️'}
-        return f"{card['rank']} {suits[card['suit']]}"
+        return CARD_SYMBOLS[card]
 
     async def _process_player_turns(self, interaction: discord.Interaction, game: 'BlackjackGame'):
         """Process player turns with improved turn management."""
@@ -536,9 +619,31 @@ class Blackjack(commands.Cog):
 
     async def check_game_over(self, interaction, game):
         """Checks if the game is over and resolves it."""
-        if not game.players_in_turn:
+        if not game.players_in_turn and not game.settled:
+            # Claim the round before any await: concurrent /hit and /stand calls can
+            # both find players_in_turn empty, and only one of them may settle it
+            game.settled = True
+            if self.active_games.get(game.channel_id) is game:
+                del self.active_games[game.channel_id]
+
             # Dealer's turn
             game.play_dealer_hand()
+
+            try:
+                settlements = game.settle_round()
+            except Exception as e:
+                print(f"Error settling blackjack game {game.game_id}: {e}")
+                self._cleanup_game(game.channel_id)
+                # The round can't be retried once claimed, so hand the stakes back
+                try:
+                    game.refund_bets()
+                    message = "An error occurred while paying out this round. All bets have been refunded."
+                except Exception as refund_error:
+                    print(f"Error refunding blackjack game {game.game_id}: {refund_error}")
+                    message = "An error occurred while paying out this round. Please contact an admin for a refund."
+                await interaction.channel.send(message)
+                return
+
             dealer_value = game.calculate_hand_value(game.dealer_hand)
             dealer_hand_formatted = game.format_hand(game.dealer_hand)
             
@@ -553,13 +658,12 @@ class Blackjack(commands.Cog):
             await interaction.channel.send(embed=embed)
 
             # Results
-            results = game.determine_results()
             results_embed = discord.Embed(
                 title="🎲 Game Results 🎲",
                 color=discord.Color.gold()
             )
-            
-            for player_id, result in results.items():
+
+            for player_id, (result, winnings) in settlements.items():
                 user = await self.bot.fetch_user(player_id)
                 result_emoji = {
                     'win': '🏆',
@@ -567,8 +671,7 @@ class Blackjack(commands.Cog):
                     'push': '🤝',
                     'blackjack': '🎉'
                 }.get(result, '❓')
-                
-                winnings = game.get_winnings_or_loss(result, player_id)
+
                 result_text = {
                     'win': f"Won {winnings} AC",
                     'lose': f"Lost {abs(winnings)} AC",
@@ -583,11 +686,6 @@ class Blackjack(commands.Cog):
                 )
 
             await interaction.channel.send(embed=results_embed)
-            
-            # Cleanup
-            key = game.channel_id
-            if key in self.active_games:
-                del self.active_games[key]
 
     def log_command_usage(self, interaction, command_name, input_data, output_data):
         """Logs the command usage to the database.
@@ -648,7 +746,7 @@ class Blackjack(commands.Cog):
             color=discord.Color.blue()
         )
         
-        if len(hand) == 2 and hand_value == 21:
+        if hand.is_blackjack():
             embed.add_field(
                 name="🎉 BLACKJACK! 🎉",
                 value="Congratulations on the perfect hand!",
@@ -657,58 +755,6 @@ class Blackjack(commands.Cog):
         
         await user.send(embed=embed)
 
-    def format_hand(self, hand):
-        """Formats the hand for display."""
-        return ', '.join(f"{card['rank']} of {card['suit']}" for card in hand)
-
-    def play_dealer_hand(self, hand):
-        """Plays the dealer's hand according to Blackjack rules."""
-        while self.calculate_hand_value(hand) < 17:
-            if len(self.deck) == 0:
-                self.deck = self.initialize_deck()
-                print("Deck reshuffled.")
-            hand.append(self.deck.pop())
-
-    async def start_round(self):
-        """Starts a new round of blackjack."""
-        # ... existing code ...
-        
-        # Initialize hands for all players
-        for player_id in self.players:
-            self.player_hands[player_id] = []  # Initialize empty hand for each player
-            # Deal initial two cards
-            self.player_hands[player_id].append(self.deck.pop())
-            self.player_hands[player_id].append(self.deck.pop())
-        
-        # Deal dealer's cards
-        self.dealer_hand = []  # Reset dealer's hand
-        self.dealer_hand.append(self.deck.pop())
-        self.dealer_hand.append(self.deck.pop())
-        
-        # ... rest of the method ...
-
-    def calculate_hand_value(self, hand):
-        """Calculate the total value of a hand, handling Aces optimally."""
-        value = 0
-        aces = 0
-        
-        for card in hand:
-            if card['rank'] == 'A':
-                aces += 1
-            else:
-                if card['rank'] in ['K', 'Q', 'J']:
-                    value += 10
-                else:
-                    value += int(card['rank'])
-        
-        for _ in range(aces):
-            if value + 11 <= 21:
-                value += 11
-            else:
-                value += 1
-        
-        return value
-
 class Player:
     """
     Represents a player in the blackjack game.
@@ -1,14 +1,214 @@
 import discord
-import ollama
 import json
 import os
 import asyncio
 import subprocess
+import re
+import time
+from collections import Counter, OrderedDict
 from discord.ext import commands
 from discord import app_commands
-from datetime import datetime
+from datetime import datetime, timedelta
 import sqlite3  # Import sqlite3 for database interaction
 import aiofiles  # Import aiofiles for asynchronous file operations
+from cogs.llm_backend import LLMUnavailableError
+
+class PromptFilter:
+    """
+    A cheap pre-LLM stage that rejects or answers prompts without inference.
+
+    Blocklisted terms are compiled into a single case-insensitive regex, so a
+    prompt is scanned once regardless of how many terms are configured. Length
+    limits, a per-user rate limit (via the RateLimiter cog) and canned replies
+    for trivial inputs (greetings, pings, thanks) are applied in the same pass.
+    The rate limit runs before the canned replies, which are posted publicly,
+    so spamming "hi" is limited like any other prompt.
+    """
+
+    TRIVIAL_REPLIES = {
+        'hi': "Hi there! Ask me anything.",
+        'hello': "Hello! What can I help you with?",
+        'hey': "Hey! What's on your mind?",
+        'ping': "Pong!",
+        'test': "I'm here and working.",
+        'thanks': "You're welcome!",
+        'thank you': "You're welcome!",
+        'ok': "👍",
+    }
+
+    def __init__(self, blocklist_path='./group_memories/chat_blocklist.txt',
+                 min_length=2, max_length=2000, rate_limit=5, rate_window=60.0):
+        """
+        Initialize the prompt filter.
+
+        Args:
+            blocklist_path: File with one blocked word or phrase per line.
+            min_length: Minimum prompt length after stripping whitespace.
+            max_length: Maximum prompt length.
+            rate_limit: Maximum prompts per user within ``rate_window`` seconds.
+            rate_window: Length of the rate limit window in seconds.
+        """
+        self.min_length = min_length
+        self.max_length = max_length
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.blocklist = self._compile_blocklist(self._load_terms(blocklist_path))
+        self.stats = Counter()
+        self.total_check_time = 0.0
+
+    @staticmethod
+    def _load_terms(path):
+        """Load blocklisted terms, ignoring blank lines and # comments."""
+        if not os.path.exists(path):
+            return []
+        with open(path, 'r', encoding='utf-8') as file:
+            return [line.strip() for line in file if line.strip() and not line.startswith('#')]
+
+    @staticmethod
+    def _compile_blocklist(terms):
+        """Compile all terms into one alternation, longest first so phrases win."""
+        if not terms:
+            return None
+        alternation = '|'.join(re.escape(term) for term in sorted(set(terms), key=len, reverse=True))
+        return re.compile(rf'\b(?:{alternation})\b', re.IGNORECASE)
+
+    def check(self, user_id, prompt, rate_limiter=None):
+        """Run the filter over a prompt.
+
+        Args:
+            user_id: The ID of the user sending the prompt.
+            prompt: The raw prompt text.
+            rate_limiter: The RateLimiter cog; the rate rule is skipped if None.
+
+        Returns:
+            tuple: ``(reason, reply)``. ``reason`` is None when the prompt should go
+            to the LLM; otherwise ``reply`` is the message to send instead.
+        """
+        start = time.perf_counter()
+        reason, reply = self._check(user_id, prompt, rate_limiter)
+        self.total_check_time += time.perf_counter() - start
+        self.stats['checked'] += 1
+        if reason:
+            self.stats[reason] += 1
+            self.stats['llm_calls_saved'] += 1
+        return reason, reply
+
+    def _check(self, user_id, prompt, rate_limiter):
+        text = prompt.strip()
+        if len(text) < self.min_length:
+            return 'too_short', "Please send a longer message."
+        if len(text) > self.max_length:
+            return 'too_long', f"Please keep your message under {self.max_length} characters."
+
+        if rate_limiter and rate_limiter.consume(user_id, 'chat', None, self.rate_limit, self.rate_window):
+            return 'rate_limited', "You're sending messages too quickly. Please slow down."
+
+        normalized = ' '.join(re.sub(r'[^\w\s]', '', text.lower()).split())
+        if normalized in self.TRIVIAL_REPLIES:
+            return 'trivial', self.TRIVIAL_REPLIES[normalized]
+
+        if self.blocklist and self.blocklist.search(text):
+            return 'blocked', "Sorry, I can't help with that."
+        return None, None
+
+class ChatSettingsCache:
+    """
+    An LRU cache of per-channel and per-guild chat settings.
+
+    All settings rows are loaded in bulk at startup. Writes go through the cache
+    (write-through), so in steady state a chat never queries the settings tables.
+    If the cache ever has to evict, misses fall back to a database lookup.
+    """
+
+    FIELDS = ('system_prompt', 'model', 'default_mode')
+
+    def __init__(self, conn, default_system_prompt, max_entries=2048):
+        """
+        Initialize the settings cache.
+
+        Args:
+            conn: The SQLite connection holding the settings tables.
+            default_system_prompt: Prompt used for new channel rows that don't set one.
+            max_entries: Maximum number of channel/guild entries kept in memory.
+        """
+        self.conn = conn
+        self.default_system_prompt = default_system_prompt
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (scope, id): settings dict or None
+        self.complete = False  # True while every stored row is in memory
+
+    def _query(self, scope):
+        if scope == 'channel':
+            return 'SELECT channel_id, system_prompt, model, default_mode FROM group_settings'
+        return 'SELECT guild_id, system_prompt, model, default_mode FROM guild_chat_settings'
+
+    @classmethod
+    def _row_to_settings(cls, row):
+        return {field: row[i + 1] for i, field in enumerate(cls.FIELDS)}
+
+    def load_all(self):
+        """Loads every channel and guild settings row into the cache."""
+        self.entries.clear()
+        self.complete = True
+        for scope in ('channel', 'guild'):
+            for row in self.conn.execute(self._query(scope)).fetchall():
+                self._put((scope, str(row[0])), self._row_to_settings(row))
+
+    def _put(self, key, settings):
+        self.entries[key] = settings
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.complete = False
+
+    def get(self, scope, scope_id):
+        """Returns the settings for a channel or guild, or None if none are stored.
+
+        Args:
+            scope: Either 'channel' or 'guild'.
+            scope_id: The channel or guild ID as a string.
+        """
+        key = (scope, scope_id)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if self.complete:
+            return None
+
+        id_column = 'channel_id' if scope == 'channel' else 'guild_id'
+        row = self.conn.execute(f'{self._query(scope)} WHERE {id_column} = ?', (scope_id,)).fetchone()
+        settings = self._row_to_settings(row) if row else None
+        self._put(key, settings)  # Cache misses too, so absent rows aren't re-queried
+        return settings
+
+    def persist(self, scope, scope_id, **fields):
+        """Writes settings to the database in a single transaction.
+
+        Only the given fields are changed. Returns the full stored settings so the
+        caller can pass them to ``put``. Safe to run in a worker thread.
+        """
+        timestamp = datetime.now().isoformat()
+        table, id_column = ('group_settings', 'channel_id') if scope == 'channel' else ('guild_chat_settings', 'guild_id')
+        updated = list(fields)
+        inserted = dict(fields)
+        if scope == 'channel':
+            # group_settings.system_prompt is NOT NULL, so new rows start from the default
+            inserted.setdefault('system_prompt', self.default_system_prompt)
+
+        with self.conn:
+            self.conn.execute(f'''
+                INSERT INTO {table} ({id_column}, {', '.join(inserted)}, last_updated)
+                VALUES (?, {', '.join('?' for _ in inserted)}, ?)
+                ON CONFLICT({id_column}) DO UPDATE SET
+                    {', '.join(f'{column} = excluded.{column}' for column in updated)},
+                    last_updated = excluded.last_updated
+            ''', (scope_id, *inserted.values(), timestamp))
+            row = self.conn.execute(f'{self._query(scope)} WHERE {id_column} = ?', (scope_id,)).fetchone()
+        return self._row_to_settings(row)
+
+    def put(self, scope, scope_id, settings):
+        """Updates the cached settings after a write."""
+        self._put((scope, scope_id), settings)
 
 class Chat(commands.Cog):
     """
@@ -31,12 +231,22 @@ class Chat(commands.Cog):
         }
         os.makedirs(self.memory_directory['individual'], exist_ok=True)
         self.default_system_prompt = "You are a helpful assistant."  # Default system message
+        self.prompt_filter = PromptFilter()
+
+        # Channel summarization settings
+        self.SUMMARY_CHUNK_TOKENS = 1500   # Approximate token budget per chunk
+        self.SUMMARY_CONCURRENCY = 4       # Chunk summaries in flight at once
+        self.SUMMARY_MAX_HOURS = 168
 
         # Initialize SQLite database connection
         self.db_path = './group_memories/aura_memory.db'
         self.conn = self._create_db_connection()
         self._initialize_group_tables()
 
+        # Channel and guild chat settings, loaded once and kept in sync on write
+        self.settings_cache = ChatSettingsCache(self.conn, self.default_system_prompt)
+        self.settings_cache.load_all()
+
         # Start ollama serve when the bot is initialized
         self.start_ollama_serve()
 
@@ -107,20 +317,64 @@ class Chat(commands.Cog):
                     last_updated TEXT NOT NULL
                 )
             ''')
+
+            # Per-channel model and mode overrides were added after group_settings
+            for column in ('model', 'default_mode'):
+                try:
+                    self.conn.execute(f'ALTER TABLE group_settings ADD COLUMN {column} TEXT')
+                except sqlite3.OperationalError:
+                    pass  # Column already exists
+
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS guild_chat_settings (
+                    guild_id TEXT PRIMARY KEY,
+                    system_prompt TEXT,
+                    model TEXT,
+                    default_mode TEXT,
+                    last_updated TEXT NOT NULL
+                )
+            ''')
+
+            # Cached chunk summaries, keyed by the exact message range they cover
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS group_summaries (
+                    channel_id TEXT NOT NULL,
+                    bucket_start TEXT NOT NULL,
+                    first_message_id INTEGER NOT NULL,
+                    last_message_id INTEGER NOT NULL,
+                    summary TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (channel_id, first_message_id, last_message_id)
+                )
+            ''')
             self.conn.commit()
         except Exception as e:
             print(f"Failed to initialize group tables: {str(e)}")
 
-    async def load_group_memory(self, channel_id):
+    def resolve_settings(self, channel_id, guild_id=None):
+        """Resolves chat settings for a channel, falling back to guild and bot defaults.
+
+        Args:
+            channel_id: The channel ID as a string.
+            guild_id: The guild ID as a string, or None in DMs.
+
+        Returns:
+            dict: The effective ``system_prompt``, ``model`` and ``default_mode``.
+        """
+        resolved = {'system_prompt': self.default_system_prompt, 'model': self.model, 'default_mode': 'group'}
+        for scope, scope_id in (('guild', guild_id), ('channel', channel_id)):
+            if scope_id is None:
+                continue
+            settings = self.settings_cache.get(scope, scope_id)
+            if settings:
+                resolved.update({key: value for key, value in settings.items() if value})
+        return resolved
+
+    async def load_group_memory(self, channel_id, guild_id=None):
         """Loads the conversation history for a group channel from database."""
         try:
-            # Get system prompt
-            cursor = self.conn.execute(
-                'SELECT system_prompt FROM group_settings WHERE channel_id = ?',
-                (channel_id,)
-            )
-            result = cursor.fetchone()
-            system_prompt = result[0] if result else self.default_system_prompt
+            # System prompt comes from the settings cache, not the database
+            system_prompt = self.resolve_settings(channel_id, guild_id)['system_prompt']
 
             # Get recent messages (last 20 for example)
             cursor = self.conn.execute('''
@@ -178,13 +432,16 @@ class Chat(commands.Cog):
         - DMs are always private
         - Guild channels default to group but can be overridden
         """
+        guild_id = str(interaction.guild_id) if interaction.guild_id else None
+        settings = self.resolve_settings(str(interaction.channel_id), guild_id)
+
         # In DMs, force private mode and ignore any mode parameter
         if isinstance(interaction.channel, discord.DMChannel):
             mode = "private"
         # In guilds, set default or validate override
         else:
             if mode is None:
-                mode = "group"
+                mode = settings['default_mode']
             elif mode not in ["private", "group"]:
                 await interaction.response.send_message(
                     "Invalid mode. Please use 'private' or 'group'.", 
@@ -192,17 +449,38 @@ class Chat(commands.Cog):
                 )
                 return
 
+        # Answer or reject prompts that don't need the LLM
+        reason, reply = self.prompt_filter.check(interaction.user.id, prompt, self.bot.get_cog('RateLimiter'))
+        if reason:
+            await interaction.response.send_message(reply, ephemeral=reason != 'trivial')
+            self.log_command_usage(interaction, f"chat_filtered_{reason}", prompt)
+            return
+
+        # Fail fast instead of deferring while the LLM backend is known to be down
+        backend = self.bot.get_cog('LLMBackend')
+        if not backend.is_available():
+            await interaction.response.send_message(
+                "The AI is taking a short break right now. Please try again in a minute.",
+                ephemeral=True
+            )
+            return
+
         await interaction.response.defer(thinking=True)
         
         try:
             if mode == "private":
                 memory_data = await asyncio.to_thread(self.load_memory, str(interaction.user.id))
             else:
-                memory_data = await self.load_group_memory(str(interaction.channel_id))
+                memory_data = await self.load_group_memory(str(interaction.channel_id), guild_id)
 
             # Add username context for all chats
             user_context = f"{interaction.user.name}: "
             formatted_prompt = f"{user_context}{prompt}"
+            user_message = {
+                'role': 'user',
+                'content': formatted_prompt,
+                'timestamp': datetime.now().isoformat()
+            }
 
             # For group chat, save the user message immediately
             if mode != "private":
@@ -213,12 +491,17 @@ class Chat(commands.Cog):
                     'user',
                     formatted_prompt
                 )
+            memory_data['history'].append(user_message)
 
-            # Generate response using updated history
-            response = await asyncio.to_thread(
-                ollama.chat,
-                model=self.model,
-                messages=memory_data['history']
+            # Generate response using the system prompt and updated history
+            messages = [{'role': 'system', 'content': memory_data['system_prompt']}]
+            messages.extend(
+                {'role': message['role'], 'content': message['content']}
+                for message in memory_data['history']
+            )
+            response = await backend.chat(
+                model=settings['model'],
+                messages=messages
             )
 
             bot_response = response['message']['content']
@@ -246,10 +529,44 @@ class Chat(commands.Cog):
             # Log the interaction
             self.log_command_usage(interaction, f"{mode}_chat", prompt)
 
+        except LLMUnavailableError:
+            await interaction.followup.send(
+                "The AI is taking a short break right now. Please try again in a minute.",
+                ephemeral=True
+            )
+            self.log_command_usage(interaction, "chat_unavailable", prompt)
         except Exception as e:
             await interaction.followup.send(f"An error occurred: {str(e)}", ephemeral=True)
             self.log_command_usage(interaction, "chat_error", str(e))
 
+    @app_commands.command(name="chat_filter_stats", description="Shows how many LLM calls the chat pre-filter saved.")
+    async def chat_filter_stats(self, interaction: discord.Interaction):
+        """Reports pre-filter counters and the average time spent per check.
+
+        Args:
+            interaction: The interaction that triggered this command.
+        """
+        stats = self.prompt_filter.stats
+        checked = stats['checked']
+        avg_us = (self.prompt_filter.total_check_time / checked * 1_000_000) if checked else 0.0
+
+        embed = discord.Embed(title="🧹 Chat Filter Stats", color=discord.Color.blue())
+        embed.add_field(name="Prompts checked", value=str(checked), inline=True)
+        embed.add_field(name="LLM calls saved", value=str(stats['llm_calls_saved']), inline=True)
+        embed.add_field(name="Avg check time", value=f"{avg_us:.1f} µs", inline=True)
+        embed.add_field(
+            name="Breakdown",
+            value=(
+                f"Trivial: {stats['trivial']}\n"
+                f"Blocked: {stats['blocked']}\n"
+                f"Rate limited: {stats['rate_limited']}\n"
+                f"Too short: {stats['too_short']}\n"
+                f"Too long: {stats['too_long']}"
+            ),
+            inline=False
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
     @app_commands.command(name="set_prompt", description="Sets the system prompt for the assistant.")
     @app_commands.describe(system_prompt="The new system prompt.")
     async def set_prompt(self, interaction: discord.Interaction, system_prompt: str):
@@ -354,6 +671,211 @@ class Chat(commands.Cog):
             print(f"Unexpected error in log_command_usage: {e}")
             # Not critical, so we don't raise an exception
 
+    @app_commands.command(name="summarize", description="Summarizes this channel's chat history.")
+    @app_commands.describe(hours="How many hours of history to summarize (default 24).")
+    async def summarize(self, interaction: discord.Interaction, hours: int = 24):
+        """Summarizes the channel's group chat history over the last few hours.
+
+        History is split into hourly buckets and then into token-bounded chunks.
+        Chunks are summarized concurrently (map), cached by message range, and the
+        chunk summaries are then combined into a final summary (reduce).
+
+        Args:
+            interaction: The interaction that triggered this command.
+            hours: How many hours of history to include.
+        """
+        if isinstance(interaction.channel, discord.DMChannel):
+            await interaction.response.send_message("This command can only be used in server channels.", ephemeral=True)
+            return
+        if not 1 <= hours <= self.SUMMARY_MAX_HOURS:
+            await interaction.response.send_message(
+                f"Please choose between 1 and {self.SUMMARY_MAX_HOURS} hours.", ephemeral=True
+            )
+            return
+
+        backend = self.bot.get_cog('LLMBackend')
+        if not backend.is_available():
+            await interaction.response.send_message(
+                "The AI is taking a short break right now. Please try again in a minute.",
+                ephemeral=True
+            )
+            return
+
+        await interaction.response.defer(thinking=True)
+
+        try:
+            channel_id = str(interaction.channel_id)
+            # Start on an hour boundary so the oldest bucket's chunks match the cache
+            since = (datetime.now() - timedelta(hours=hours)).replace(minute=0, second=0, microsecond=0).isoformat()
+            rows = await asyncio.to_thread(self._fetch_history_since, channel_id, since)
+            if not rows:
+                await interaction.followup.send(f"There is no chat history in the last {hours} hours.")
+                return
+
+            chunks = self._chunk_history(rows)
+            chunk_summaries = await self._summarize_chunks(backend, channel_id, chunks)
+            summary = await self._reduce_summaries(backend, chunk_summaries)
+
+            await send_message_in_chunks(interaction, f"**Summary of the last {hours} hours:**\n{summary}")
+            self.log_command_usage(interaction, "summarize", f"{hours}h, {len(rows)} messages, {len(chunks)} chunks")
+
+        except LLMUnavailableError:
+            await interaction.followup.send(
+                "The AI is taking a short break right now. Please try again in a minute.",
+                ephemeral=True
+            )
+        except Exception as e:
+            await interaction.followup.send(f"Failed to summarize the channel: {str(e)}", ephemeral=True)
+            self.log_command_usage(interaction, "summarize_error", str(e))
+
+    def _fetch_history_since(self, channel_id, since):
+        """Fetches a channel's messages since the given ISO timestamp, oldest first."""
+        cursor = self.conn.execute('''
+            SELECT id, username, role, content, timestamp
+            FROM group_messages
+            WHERE channel_id = ? AND timestamp >= ?
+            ORDER BY id
+        ''', (channel_id, since))
+        return cursor.fetchall()
+
+    @staticmethod
+    def _estimate_tokens(text):
+        """Roughly estimates the token count of a text (about 4 characters per token)."""
+        return len(text) // 4 + 1
+
+    def _chunk_history(self, rows):
+        """Splits history rows into token-bounded chunks that never span an hour bucket.
+
+        Keeping chunks inside hourly buckets means older chunks keep the same
+        message range on every request, so their cached summaries stay valid.
+
+        Returns:
+            list: Dicts with ``bucket_start``, ``first_id``, ``last_id`` and ``text``.
+        """
+        chunks = []
+        current = None
+        for row in rows:
+            line = row['content'] if row['role'] == 'user' else f"{row['username']}: {row['content']}"
+            tokens = self._estimate_tokens(line)
+            bucket_start = row['timestamp'][:13]  # YYYY-MM-DDTHH
+            if (current is None or current['bucket_start'] != bucket_start
+                    or current['tokens'] + tokens > self.SUMMARY_CHUNK_TOKENS):
+                current = {'bucket_start': bucket_start, 'first_id': row['id'], 'lines': [], 'tokens': 0}
+                chunks.append(current)
+            current['lines'].append(line)
+            current['tokens'] += tokens
+            current['last_id'] = row['id']
+
+        return [
+            {
+                'bucket_start': chunk['bucket_start'],
+                'first_id': chunk['first_id'],
+                'last_id': chunk['last_id'],
+                'text': '\n'.join(chunk['lines'])
+            }
+            for chunk in chunks
+        ]
+
+    def _load_cached_summaries(self, channel_id, chunks):
+        """Returns cached summaries for the given chunks as {(first_id, last_id): summary}."""
+        if not chunks:
+            return {}
+        cursor = self.conn.execute('''
+            SELECT first_message_id, last_message_id, summary
+            FROM group_summaries
+            WHERE channel_id = ? AND first_message_id BETWEEN ? AND ?
+        ''', (channel_id, chunks[0]['first_id'], chunks[-1]['last_id']))
+        return {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+
+    def _store_summaries(self, channel_id, new_summaries):
+        """Caches freshly generated chunk summaries and prunes those too old to be requested again."""
+        now = datetime.now()
+        timestamp = now.isoformat()
+        oldest_bucket = (now - timedelta(hours=self.SUMMARY_MAX_HOURS)).isoformat()[:13]
+        with self.conn:
+            self.conn.execute('DELETE FROM group_summaries WHERE bucket_start < ?', (oldest_bucket,))
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO group_summaries
+                (channel_id, bucket_start, first_message_id, last_message_id, summary, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (channel_id, chunk['bucket_start'], chunk['first_id'], chunk['last_id'], summary, timestamp)
+                for chunk, summary in new_summaries
+            ])
+
+    async def _summarize_text(self, backend, text, instruction):
+        """Runs a single summarization request through the LLM backend."""
+        response = await backend.generate(
+            model=self.model,
+            prompt=f"{instruction}\n\n{text}",
+            options={"temperature": 0.3}
+        )
+        return response.get('response', '').strip()
+
+    async def _summarize_chunks(self, backend, channel_id, chunks):
+        """Map step: summarizes every uncached chunk concurrently.
+
+        Returns:
+            list: Chunk summaries in chronological order.
+        """
+        cached = await asyncio.to_thread(self._load_cached_summaries, channel_id, chunks)
+        pending = [chunk for chunk in chunks if (chunk['first_id'], chunk['last_id']) not in cached]
+        semaphore = asyncio.Semaphore(self.SUMMARY_CONCURRENCY)
+
+        async def summarize_chunk(chunk):
+            async with semaphore:
+                return await self._summarize_text(
+                    backend,
+                    chunk['text'],
+                    "Summarize the following part of a Discord conversation in a few bullet points. "
+                    "Mention who said what when it matters."
+                )
+
+        results = await asyncio.gather(*(summarize_chunk(chunk) for chunk in pending))
+        new_summaries = list(zip(pending, results))
+        if new_summaries:
+            await asyncio.to_thread(self._store_summaries, channel_id, new_summaries)
+
+        for chunk, summary in new_summaries:
+            cached[(chunk['first_id'], chunk['last_id'])] = summary
+        return [cached[(chunk['first_id'], chunk['last_id'])] for chunk in chunks]
+
+    async def _reduce_summaries(self, backend, summaries):
+        """Reduce step: combines chunk summaries, recursing while they exceed one chunk.
+
+        Every group holds at least two summaries, so each pass at least halves
+        the count even when the LLM returns summaries longer than half a chunk.
+        """
+        instruction = (
+            "Combine these partial summaries of a Discord conversation into one concise summary. "
+            "Keep the most important topics, decisions and questions."
+        )
+        while True:
+            groups = [[]]
+            tokens = 0
+            for summary in summaries:
+                summary_tokens = self._estimate_tokens(summary)
+                if len(groups[-1]) >= 2 and tokens + summary_tokens > self.SUMMARY_CHUNK_TOKENS:
+                    groups.append([])
+                    tokens = 0
+                groups[-1].append(summary)
+                tokens += summary_tokens
+
+            if len(groups) == 1:
+                if len(summaries) == 1:
+                    return summaries[0]
+                return await self._summarize_text(backend, '\n\n'.join(summaries), instruction)
+
+            semaphore = asyncio.Semaphore(self.SUMMARY_CONCURRENCY)
+
+            async def reduce_group(group):
+                if len(group) == 1:
+                    return group[0]
+                async with semaphore:
+                    return await self._summarize_text(backend, '\n\n'.join(group), instruction)
+
+            summaries = await asyncio.gather(*(reduce_group(group) for group in groups))
+
     @app_commands.command(name="set_group_prompt", description="Sets the system prompt for the current channel.")
     @app_commands.describe(system_prompt="The new system prompt for this channel.")
     async def set_group_prompt(self, interaction: discord.Interaction, system_prompt: str):
@@ -365,21 +887,71 @@ class Chat(commands.Cog):
         await interaction.response.defer(thinking=True)
 
         try:
-            timestamp = datetime.now().isoformat()
-            await asyncio.to_thread(
-                self.conn.execute,
-                '''
-                INSERT OR REPLACE INTO group_settings (channel_id, system_prompt, last_updated)
-                VALUES (?, ?, ?)
-                ''',
-                (str(interaction.channel_id), system_prompt, timestamp)
+            channel_id = str(interaction.channel_id)
+            settings = await asyncio.to_thread(
+                self.settings_cache.persist, 'channel', channel_id, system_prompt=system_prompt
             )
-            await asyncio.to_thread(self.conn.commit)
+            self.settings_cache.put('channel', channel_id, settings)
             
             await interaction.followup.send(f"Channel system prompt has been updated.", ephemeral=True)
         except Exception as e:
             await interaction.followup.send(f"Failed to set system prompt: {str(e)}", ephemeral=True)
 
+    @app_commands.command(name="set_guild_chat_defaults", description="Sets the server-wide chat defaults.")
+    @app_commands.describe(
+        system_prompt="Default system prompt for channels without their own.",
+        model="Default Ollama model for this server.",
+        default_mode="Default chat mode (private/group)."
+    )
+    @app_commands.default_permissions(manage_guild=True)
+    async def set_guild_chat_defaults(self, interaction: discord.Interaction, system_prompt: str = None,
+                                      model: str = None, default_mode: str = None):
+        """Sets the server-wide chat defaults used when a channel has no override."""
+        if interaction.guild_id is None:
+            await interaction.response.send_message("This command can only be used in servers.", ephemeral=True)
+            return
+        if default_mode is not None and default_mode not in ["private", "group"]:
+            await interaction.response.send_message("Invalid mode. Please use 'private' or 'group'.", ephemeral=True)
+            return
+
+        fields = {
+            key: value for key, value in
+            (('system_prompt', system_prompt), ('model', model), ('default_mode', default_mode))
+            if value is not None
+        }
+        if not fields:
+            await interaction.response.send_message("Please provide at least one setting to change.", ephemeral=True)
+            return
+
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        try:
+            if model is not None:
+                # The model is used for every chat in the server, so only accept one the pool can serve
+                backend = self.bot.get_cog('LLMBackend')
+                available = await backend.check_model(model)
+                if available is None:
+                    await interaction.followup.send(
+                        "Couldn't reach the language model backend to verify that model. Please try again later.",
+                        ephemeral=True
+                    )
+                    return
+                if not available:
+                    installed = ', '.join(backend.installed_models()) or "none"
+                    await interaction.followup.send(
+                        f"Unknown model `{model}`. Available models: {installed}", ephemeral=True
+                    )
+                    return
+
+            guild_id = str(interaction.guild_id)
+            settings = await asyncio.to_thread(self.settings_cache.persist, 'guild', guild_id, **fields)
+            self.settings_cache.put('guild', guild_id, settings)
+
+            self.log_command_usage(interaction, "set_guild_chat_defaults", str(fields))
+            await interaction.followup.send("Server chat defaults have been updated.", ephemeral=True)
+        except Exception as e:
+            await interaction.followup.send(f"Failed to update chat defaults: {str(e)}", ephemeral=True)
+
 async def send_message_in_chunks(interaction, message, chunk_size=1900):
     """Sends a message in chunks if it exceeds the specified chunk size.
 
@@ -7,6 +7,7 @@ from datetime import datetime
 import sqlite3
 from discord.app_commands import checks
 from discord import ui
+from cogs.rate_limiter import cooldown
 
 class Fishing(commands.Cog):
     """
@@ -101,7 +102,7 @@ class Fishing(commands.Cog):
             print(f"Error in /buy_bait command: {str(e)}")
 
     @discord.app_commands.command(name="fish", description="Go fishing to catch fish.")
-    @discord.app_commands.checks.cooldown(1, 30)  # One use every 30 seconds
+    @cooldown(1, 30, persist=True)  # One use every 30 seconds, kept across restarts
     async def fish(self, interaction: discord.Interaction):
         """Allows a user to go fishing using their bait."""
         user = interaction.user
@@ -0,0 +1,398 @@
+# llm_backend.py
+
+import os
+import time
+import asyncio
+import aiohttp
+from discord.ext import commands, tasks
+from dotenv import load_dotenv
+from typing import Dict, List, Optional, Set
+
+# Endpoint configuration lives next to the Discord token
+load_dotenv('./token.env')
+
+DEFAULT_OLLAMA_HOST = "http://localhost:11434"
+
+
+def _parse_endpoints(value: str) -> List[str]:
+    """Parse a comma-separated list of Ollama base URLs."""
+    return [url.strip().rstrip('/') for url in value.split(',') if url.strip()]
+
+
+def _parse_model_affinity(value: str) -> Dict[str, Set[str]]:
+    """Parse an endpoint-to-models affinity map.
+
+    Format: ``http://host:11434=llama3.2,mistral;http://host:11435=llava``.
+    Endpoints without an entry accept every model.
+    """
+    affinity = {}
+    for entry in value.split(';'):
+        if '=' not in entry:
+            continue
+        url, models = entry.split('=', 1)
+        affinity[url.strip().rstrip('/')] = {m.strip() for m in models.split(',') if m.strip()}
+    return affinity
+
+
+class LLMBackendError(Exception):
+    """Raised when no Ollama endpoint could serve a request."""
+
+
+class LLMUnavailableError(LLMBackendError):
+    """Raised without contacting Ollama while the circuit breaker is open."""
+
+
+class LLMRequestError(LLMBackendError):
+    """Raised when Ollama rejects a request (4xx) or no endpoint serves the model.
+
+    These say nothing about backend health, so they never eject an endpoint
+    or count toward the circuit breaker.
+    """
+
+
+class CircuitBreaker:
+    """
+    Fails LLM requests fast while the backend is down.
+
+    The breaker opens after ``failure_threshold`` consecutive failures. While open,
+    requests are rejected immediately. After ``reset_timeout`` seconds it goes
+    half-open and lets a single trial request through; success closes it again,
+    failure re-opens it for another ``reset_timeout``.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Return True if a request may be sent to the backend right now."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self.trial_in_flight = False
+            print("LLM circuit breaker half-open, probing backend.")
+        if self.trial_in_flight:
+            return False
+        self.trial_in_flight = True
+        return True
+
+    def is_open(self) -> bool:
+        """Return True if new requests would currently be rejected."""
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def release_trial(self):
+        """Let another half-open trial through without counting a result."""
+        self.trial_in_flight = False
+
+    def probe_succeeded(self):
+        """Let a trial request through early after a passing health check.
+
+        A probe only shows the endpoint answers, not that generation works, so it
+        moves OPEN to HALF_OPEN; only a successful real request closes the breaker.
+        """
+        if self.state == self.OPEN:
+            self.state = self.HALF_OPEN
+            self.trial_in_flight = False
+            print("LLM circuit breaker half-open after a passing health check.")
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            print("LLM circuit breaker closed, backend recovered.")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                print(f"LLM circuit breaker opened after {self.consecutive_failures} consecutive failures.")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class OllamaEndpoint:
+    """Tracks load and health for a single Ollama instance."""
+
+    def __init__(self, url: str, models: Optional[Set[str]] = None):
+        self.url = url
+        self.models = models  # None means any model is allowed
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.latency = 0.0  # Smoothed health probe latency in seconds
+        self.installed: Optional[Set[str]] = None  # Model names from the last health probe
+
+    def serves(self, model: str) -> bool:
+        """Check whether this endpoint is allowed to serve the given model."""
+        return self.models is None or model in self.models
+
+    def has_installed(self, model: str) -> bool:
+        """Check the last probe's model list; ``llama3.2`` matches ``llama3.2:latest``."""
+        return bool(self.installed) and (model in self.installed or f"{model}:latest" in self.installed)
+
+
+class LLMBackend(commands.Cog):
+    """
+    A cog that routes LLM requests across a pool of Ollama endpoints.
+    Requests go to the healthy endpoint with the fewest outstanding requests,
+    and a background health check ejects and re-admits slow or failing instances.
+    A circuit breaker fails requests immediately while the whole backend is down.
+    """
+
+    def __init__(self, bot):
+        """
+        Initialize the LLMBackend cog.
+
+        Args:
+            bot: An instance of the Discord bot.
+        """
+        self.bot = bot
+        affinity = _parse_model_affinity(os.getenv('OLLAMA_MODEL_AFFINITY', ''))
+        urls = _parse_endpoints(os.getenv('OLLAMA_ENDPOINTS', DEFAULT_OLLAMA_HOST))
+        self.endpoints = [OllamaEndpoint(url, affinity.get(url)) for url in urls]
+        self.REQUEST_TIMEOUT = float(os.getenv('OLLAMA_REQUEST_TIMEOUT', 120))
+        self.PROBE_TIMEOUT = 5.0
+        self.SLOW_PROBE_SECONDS = 2.0
+        self.EJECT_AFTER_FAILURES = 3
+        self.CONNECT_TIMEOUT = 5.0
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30.0)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def cog_load(self):
+        """Open the shared HTTP session and start health checks."""
+        self.session = aiohttp.ClientSession()
+        self.health_check.start()
+
+    async def cog_unload(self):
+        """Stop health checks and close the HTTP session."""
+        self.health_check.cancel()
+        if self.session:
+            await self.session.close()
+
+    def _select_endpoint(self, model: str, exclude=()) -> Optional[OllamaEndpoint]:
+        """Pick the least-loaded endpoint for a model.
+
+        Healthy endpoints are preferred; if every eligible endpoint is ejected,
+        the least recently failing one is tried rather than giving up.
+        """
+        eligible = [ep for ep in self.endpoints if ep.serves(model) and ep not in exclude]
+        if not eligible:
+            return None
+        healthy = [ep for ep in eligible if ep.healthy]
+        if healthy:
+            return min(healthy, key=lambda ep: (ep.outstanding, ep.latency))
+        return min(eligible, key=lambda ep: (ep.consecutive_failures, ep.outstanding))
+
+    def _record_success(self, endpoint: OllamaEndpoint):
+        endpoint.consecutive_failures = 0
+        if not endpoint.healthy:
+            endpoint.healthy = True
+            print(f"Ollama endpoint {endpoint.url} re-admitted to the pool.")
+
+    def _record_failure(self, endpoint: OllamaEndpoint, reason: str):
+        endpoint.consecutive_failures += 1
+        if endpoint.healthy and endpoint.consecutive_failures >= self.EJECT_AFTER_FAILURES:
+            endpoint.healthy = False
+            print(f"Ollama endpoint {endpoint.url} ejected from the pool: {reason}")
+
+    def is_available(self) -> bool:
+        """Return False while the circuit breaker is rejecting requests."""
+        return not self.breaker.is_open()
+
+    def is_idle(self) -> bool:
+        """Return True when no request is in flight, so background work may run."""
+        return all(ep.outstanding == 0 for ep in self.endpoints)
+
+    async def check_model(self, model: str) -> Optional[bool]:
+        """Check whether any endpoint allowed to serve a model has it installed.
+
+        Endpoints that have not been probed yet are probed first.
+
+        Returns:
+            Optional[bool]: True or False, or None if no eligible endpoint could be reached.
+        """
+        eligible = [ep for ep in self.endpoints if ep.serves(model)]
+        if not eligible:
+            return False
+        unprobed = [ep for ep in eligible if ep.installed is None]
+        if unprobed:
+            await asyncio.gather(*(self._probe(ep) for ep in unprobed))
+        if any(ep.has_installed(model) for ep in eligible):
+            return True
+        if all(ep.installed is None for ep in eligible):
+            return None
+        return False
+
+    def installed_models(self) -> List[str]:
+        """Return every model name reported by the last health probes, without ``:latest`` tags."""
+        names = set()
+        for ep in self.endpoints:
+            names.update(name[:-len(':latest')] if name.endswith(':latest') else name for name in ep.installed or ())
+        return sorted(names)
+
+    async def _post(self, path: str, payload: dict, model: str, timeout: Optional[float] = None) -> dict:
+        """POST a request through the circuit breaker."""
+        if not self.breaker.allow_request():
+            raise LLMUnavailableError("The language model backend is currently unavailable.")
+        try:
+            result = await self._post_to_pool(path, payload, model, timeout)
+        except LLMRequestError:
+            self.breaker.release_trial()
+            raise
+        except LLMBackendError:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled or unexpected errors say nothing about backend health
+            self.breaker.release_trial()
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def _post_to_pool(self, path: str, payload: dict, model: str, timeout: Optional[float] = None) -> dict:
+        """POST a request to the best endpoint, retrying once elsewhere on connection errors.
+
+        Raises:
+            LLMRequestError: If Ollama rejects the request or no endpoint serves the model.
+            LLMBackendError: On connection errors, timeouts and 5xx replies.
+        """
+        tried = []
+        last_error = None
+        for _ in range(min(2, len(self.endpoints))):
+            endpoint = self._select_endpoint(model, exclude=tried)
+            if endpoint is None:
+                if not tried:
+                    raise LLMRequestError(f"No Ollama endpoint serves model {model}.")
+                break
+            tried.append(endpoint)
+            endpoint.outstanding += 1
+            try:
+                async with self.session.post(
+                    f"{endpoint.url}{path}",
+                    json=payload,
+                    timeout=aiohttp.ClientTimeout(
+                        total=timeout or self.REQUEST_TIMEOUT,
+                        sock_connect=self.CONNECT_TIMEOUT
+                    )
+                ) as response:
+                    if 400 <= response.status < 500:
+                        # A bad request or unknown model is the caller's problem, not the endpoint's
+                        text = await response.text()
+                        raise LLMRequestError(f"Ollama rejected the request with status {response.status}: {text}")
+                    if response.status != 200:
+                        text = await response.text()
+                        self._record_failure(endpoint, f"status {response.status}")
+                        raise LLMBackendError(f"Ollama returned status {response.status}: {text}")
+                    result = await response.json()
+                self._record_success(endpoint)
+                return result
+            except aiohttp.ClientConnectionError as e:
+                self._record_failure(endpoint, str(e))
+                last_error = e
+            except asyncio.TimeoutError as e:
+                self._record_failure(endpoint, "request timed out")
+                raise LLMBackendError(f"Ollama request to {endpoint.url} timed out") from e
+            finally:
+                endpoint.outstanding -= 1
+
+        raise LLMBackendError(f"No Ollama endpoint available for model {model}: {last_error}")
+
+    async def chat(self, model: str, messages: List[dict], options: Optional[dict] = None,
+                   timeout: Optional[float] = None) -> dict:
+        """Send a chat request to the pool.
+
+        Args:
+            model: The model to use.
+            messages: The conversation history in Ollama message format.
+            options: Optional Ollama generation options.
+            timeout: Optional request timeout in seconds.
+
+        Returns:
+            dict: The Ollama response, with the reply under ``['message']['content']``.
+        """
+        payload = {"model": model, "messages": messages, "stream": False}
+        if options:
+            payload["options"] = options
+        return await self._post("/api/chat", payload, model, timeout)
+
+    async def generate(self, model: str, prompt: str, options: Optional[dict] = None,
+                       timeout: Optional[float] = None, **extra) -> dict:
+        """Send a completion request to the pool.
+
+        Args:
+            model: The model to use.
+            prompt: The prompt text.
+            options: Optional Ollama generation options.
+            timeout: Optional request timeout in seconds.
+            **extra: Additional top-level payload fields (e.g. ``format``).
+
+        Returns:
+            dict: The Ollama response, with the text under ``['response']``.
+        """
+        payload = {"model": model, "prompt": prompt, "stream": False, **extra}
+        if options:
+            payload["options"] = options
+        return await self._post("/api/generate", payload, model, timeout)
+
+    async def _probe(self, endpoint: OllamaEndpoint):
+        """Probe a single endpoint and update its health state."""
+        start = time.monotonic()
+        try:
+            async with self.session.get(
+                f"{endpoint.url}/api/tags",
+                timeout=aiohttp.ClientTimeout(total=self.PROBE_TIMEOUT)
+            ) as response:
+                if response.status != 200:
+                    await response.read()
+                    self._record_failure(endpoint, f"health check status {response.status}")
+                    return
+                data = await response.json()
+                endpoint.installed = {
+                    name for entry in data.get('models', [])
+                    for name in (entry.get('name'), entry.get('model')) if name
+                }
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            self._record_failure(endpoint, f"health check failed: {e or 'timeout'}")
+            return
+
+        elapsed = time.monotonic() - start
+        endpoint.latency = elapsed if endpoint.latency == 0.0 else 0.7 * endpoint.latency + 0.3 * elapsed
+        if elapsed > self.SLOW_PROBE_SECONDS:
+            self._record_failure(endpoint, f"health check took {elapsed:.1f}s")
+        else:
+            self._record_success(endpoint)
+
+    @tasks.loop(seconds=15)
+    async def health_check(self):
+        """Periodically probe every endpoint in the pool.
+
+        While the circuit breaker is open, a passing probe makes it half-open
+        so the next request tests the backend without waiting out the full
+        reset timeout.
+        """
+        await asyncio.gather(*(self._probe(ep) for ep in self.endpoints))
+        if self.breaker.state == CircuitBreaker.OPEN and any(ep.healthy and ep.consecutive_failures == 0
+                                                             for ep in self.endpoints):
+            self.breaker.probe_succeeded()
+
+
+async def setup(bot):
+    """Load the LLMBackend cog into the bot.
+
+    Args:
+        bot: An instance of the Discord bot.
+    """
+    await bot.add_cog(LLMBackend(bot))
@@ -1,13 +1,146 @@
 import random
 import discord
-from discord.ext import commands
-from datetime import datetime, timedelta
+from discord.ext import commands, tasks
+from datetime import datetime
 import sqlite3
 import asyncio
-import aiohttp
 import json
 import os
+import time
+import re
+import hashlib
+import numpy as np
+from collections import Counter, defaultdict, deque
 from typing import Dict, Optional, List
+from cogs.llm_backend import LLMBackendError, LLMUnavailableError
+
+TRIVIA_CATEGORIES = ['general knowledge', 'science', 'history', 'geography', 'entertainment', 'sports']
+TRIVIA_DIFFICULTIES = ['easy', 'medium', 'hard']
+
+# JSON schema passed to Ollama's structured output ``format`` option
+TRIVIA_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "options": {"type": "array", "items": {"type": "string"}, "minItems": 4, "maxItems": 4},
+                    "answer": {"type": "string", "enum": ["A", "B", "C", "D"]},
+                    "explanation": {"type": "string"}
+                },
+                "required": ["question", "options", "answer", "explanation"]
+            }
+        }
+    },
+    "required": ["questions"]
+}
+
+class QuestionDedupIndex:
+    """
+    Detects exact and near-duplicate trivia questions.
+
+    Questions are normalized and fingerprinted for exact matches. Near-duplicates
+    are found with MinHash signatures over character shingles, bucketed by LSH
+    bands so a lookup only compares against a handful of candidates. Every
+    indexed question is persisted so the index survives restarts.
+    """
+
+    NUM_PERM = 64
+    BANDS = 16           # 16 bands x 4 rows: candidates from roughly 50% similarity
+    ROWS = NUM_PERM // BANDS
+    SHINGLE_SIZE = 4
+    THRESHOLD = 0.7      # Estimated Jaccard similarity treated as a duplicate
+    PRIME = (1 << 31) - 1
+
+    def __init__(self, conn):
+        """
+        Initialize the index and load previously generated questions.
+
+        Args:
+            conn: The SQLite connection used to persist the index.
+        """
+        self.conn = conn
+        rng = np.random.default_rng(20240601)  # Fixed seed keeps stored signatures valid
+        self.perm_a = rng.integers(1, self.PRIME, self.NUM_PERM, dtype=np.uint64)
+        self.perm_b = rng.integers(0, self.PRIME, self.NUM_PERM, dtype=np.uint64)
+        self.signatures: Dict[str, np.ndarray] = {}  # fingerprint: signature
+        self.buckets = [defaultdict(list) for _ in range(self.BANDS)]
+
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS trivia_question_index (
+                fingerprint TEXT PRIMARY KEY,
+                signature BLOB NOT NULL,
+                question TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        self.conn.commit()
+        for row in self.conn.execute('SELECT fingerprint, signature FROM trivia_question_index'):
+            self._insert(row[0], np.frombuffer(row[1], dtype=np.uint32).astype(np.uint64))
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase, drop punctuation and collapse whitespace."""
+        return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+    @classmethod
+    def fingerprint(cls, question: str) -> str:
+        """Return the exact-match fingerprint of a question."""
+        return hashlib.sha1(cls.normalize(question).encode('utf-8')).hexdigest()[:16]
+
+    def _signature(self, normalized: str) -> np.ndarray:
+        """Compute the MinHash signature of a normalized question."""
+        padded = f" {normalized} "
+        shingles = {padded[i:i + self.SHINGLE_SIZE] for i in range(max(1, len(padded) - self.SHINGLE_SIZE + 1))}
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(sh.encode('utf-8'), digest_size=4).digest(), 'little') & self.PRIME
+             for sh in shingles),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+        # Universal hashing (a*x + b) mod p for all permutations at once; fits in uint64
+        permuted = (self.perm_a[:, None] * hashes[None, :] + self.perm_b[:, None]) % np.uint64(self.PRIME)
+        return permuted.min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray):
+        return [signature[i * self.ROWS:(i + 1) * self.ROWS].tobytes() for i in range(self.BANDS)]
+
+    def _insert(self, fingerprint: str, signature: np.ndarray):
+        self.signatures[fingerprint] = signature
+        for band, key in enumerate(self._band_keys(signature)):
+            self.buckets[band][key].append(fingerprint)
+
+    def find_duplicate(self, question: str) -> Optional[str]:
+        """Return the fingerprint of an indexed duplicate of this question, if any."""
+        fingerprint = self.fingerprint(question)
+        if fingerprint in self.signatures:
+            return fingerprint
+
+        signature = self._signature(self.normalize(question))
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates.update(self.buckets[band].get(key, ()))
+        for candidate in candidates:
+            if np.mean(self.signatures[candidate] == signature) >= self.THRESHOLD:
+                return candidate
+        return None
+
+    def add(self, question: str) -> bool:
+        """Index a question. Returns False without indexing it if it is a duplicate."""
+        if self.find_duplicate(question) is not None:
+            return False
+        fingerprint = self.fingerprint(question)
+        signature = self._signature(self.normalize(question))
+        self._insert(fingerprint, signature)
+        with self.conn:
+            self.conn.execute('''
+                INSERT OR IGNORE INTO trivia_question_index (fingerprint, signature, question, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', (fingerprint, signature.astype(np.uint32).tobytes(), question, datetime.now().isoformat()))
+        return True
 
 class Trivia(commands.Cog):
     """A Discord cog for an LLM-powered trivia game with betting."""
@@ -16,11 +149,24 @@ class Trivia(commands.Cog):
         self.bot = bot
         self._setup_database()
         self.active_games: Dict[int, 'TriviaGame'] = {}  # channel_id: game
-        self.cooldowns: Dict[int, datetime] = {}  # user_id: last_play_time
-        self.lock = asyncio.Lock()
+        self.MAX_CONCURRENT_GENERATIONS = 2  # Live generations across all channels
+        self.generation_slots = asyncio.Semaphore(self.MAX_CONCURRENT_GENERATIONS)
         self.COOLDOWN_MINUTES = 5
         self.MIN_BET = 10
         self.MAX_BET = 1000
+        self.POOL_TARGET_DEPTH = 3  # Ready questions per category and difficulty
+        self.QUESTIONS_PER_REQUEST = 3
+        self.LIVE_GENERATION_ATTEMPTS = 3  # Regenerate when a live question repeats one the channel saw
+        self.generation_stats = Counter()
+        self.held_bets = Counter()  # user_id: AC staked in rounds that haven't settled yet
+        self.dedup_index = QuestionDedupIndex(self.conn)
+        self.RECENT_PER_CHANNEL = 200
+        self.recent_questions: Dict[int, deque] = defaultdict(lambda: deque(maxlen=self.RECENT_PER_CHANNEL))
+        self.refill_question_pool.start()
+
+    def cog_unload(self):
+        """Stop the question pool producer."""
+        self.refill_question_pool.cancel()
         
     def _setup_database(self):
         """Initialize database with proper configuration."""
@@ -32,39 +178,287 @@ class Trivia(commands.Cog):
         self.conn.execute('PRAGMA foreign_keys = ON')
         self.conn.execute('PRAGMA journal_mode = WAL')
 
+        # Pool of pre-generated questions, kept topped up in the background
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS trivia_questions (
+                question_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                category TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                question TEXT NOT NULL,
+                options TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                explanation TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        try:
+            self.conn.execute('ALTER TABLE trivia_questions ADD COLUMN fingerprint TEXT')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_trivia_questions_bucket
+            ON trivia_questions (category, difficulty)
+        ''')
+        self.conn.commit()
+
+    def _pop_pool_question(self, channel_id: int, category: Optional[str] = None,
+                           difficulty: Optional[str] = None) -> Optional[dict]:
+        """Take the oldest ready question matching the filters out of the pool.
+
+        Questions this channel has seen recently are skipped and left for others.
+        """
+        conditions, params = [], []
+        if category:
+            conditions.append('category = ?')
+            params.append(category)
+        if difficulty:
+            conditions.append('difficulty = ?')
+            params.append(difficulty)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        seen = set(self.recent_questions[channel_id])
+
+        with self.conn:
+            rows = self.conn.execute(
+                f'SELECT * FROM trivia_questions {where} ORDER BY question_id LIMIT 20', params
+            ).fetchall()
+            row = next((r for r in rows if r['fingerprint'] not in seen), None)
+            if row is None:
+                return None
+            self.conn.execute('DELETE FROM trivia_questions WHERE question_id = ?', (row['question_id'],))
+
+        return {
+            'question': row['question'],
+            'options': json.loads(row['options']),
+            'answer': row['answer'],
+            'explanation': row['explanation']
+        }
+
+    def _store_pool_question(self, category: str, difficulty: str, question_data: dict) -> bool:
+        """Add a generated question to the pool unless it duplicates an earlier one."""
+        if not self.dedup_index.add(question_data['question']):
+            self.generation_stats['duplicates_discarded'] += 1
+            return False
+        with self.conn:
+            self.conn.execute('''
+                INSERT INTO trivia_questions
+                (category, difficulty, question, options, answer, explanation, created_at, fingerprint)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                category, difficulty, question_data['question'], json.dumps(question_data['options']),
+                question_data['answer'], question_data['explanation'], datetime.now().isoformat(),
+                QuestionDedupIndex.fingerprint(question_data['question'])
+            ))
+        return True
+
+    def _accept_live_question(self, channel_id: int, question_data: dict) -> bool:
+        """Check a live-generated question against the index and the channel's history.
+
+        A question already generated elsewhere is still fine for a channel that
+        hasn't seen it; only recent repeats in the same channel are rejected.
+        """
+        duplicate = self.dedup_index.find_duplicate(question_data['question'])
+        if duplicate is None:
+            self.dedup_index.add(question_data['question'])
+            return True
+        if duplicate in self.recent_questions[channel_id]:
+            self.generation_stats['duplicates_discarded'] += 1
+            return False
+        return True
+
+    def _mark_seen(self, channel_id: int, question_data: dict):
+        """Remember that a channel has been served this question."""
+        self.recent_questions[channel_id].append(
+            self.dedup_index.find_duplicate(question_data['question'])
+            or QuestionDedupIndex.fingerprint(question_data['question'])
+        )
+
+    def _pool_deficits(self) -> List[tuple]:
+        """Return (category, difficulty, missing) for every bucket below its target depth."""
+        depths = {
+            (row['category'], row['difficulty']): row['depth']
+            for row in self.conn.execute('''
+                SELECT category, difficulty, COUNT(*) AS depth
+                FROM trivia_questions GROUP BY category, difficulty
+            ''')
+        }
+        deficits = []
+        for category in TRIVIA_CATEGORIES:
+            for difficulty in TRIVIA_DIFFICULTIES:
+                missing = self.POOL_TARGET_DEPTH - depths.get((category, difficulty), 0)
+                if missing > 0:
+                    deficits.append((category, difficulty, missing))
+        return deficits
+
+    @tasks.loop(seconds=30)
+    async def refill_question_pool(self):
+        """Background producer that tops up the question pool.
+
+        Runs at low priority: it only sends a request while the LLM backend is
+        idle, so live games and chat always go first.
+        """
+        backend = self.bot.get_cog('LLMBackend')
+        if backend is None:
+            return
+
+        try:
+            deficits = self._pool_deficits()
+        except sqlite3.Error as e:
+            print(f"Error reading trivia pool depth: {e}")
+            return
+
+        # Emptiest buckets first, several questions per request to amortize the prompt.
+        # An exception escaping this task would stop it for good, so each bucket is guarded.
+        for category, difficulty, missing in sorted(deficits, key=lambda d: -d[2]):
+            if not backend.is_available() or not backend.is_idle():
+                return
+            count = min(missing, self.QUESTIONS_PER_REQUEST)
+            try:
+                for question_data in await self._generate_trivia_questions(category, difficulty, count):
+                    self._store_pool_question(category, difficulty, question_data)
+            except Exception as e:
+                print(f"Error refilling trivia pool ({category}/{difficulty}): {e}")
+
+    @refill_question_pool.before_loop
+    async def before_refill_question_pool(self):
+        """Wait until the bot is ready before filling the pool."""
+        await self.bot.wait_until_ready()
+
     async def _check_cooldown(self, user_id: int) -> Optional[int]:
         """Check if user is on cooldown. Returns remaining seconds if on cooldown."""
-        if user_id in self.cooldowns:
-            elapsed = datetime.now() - self.cooldowns[user_id]
-            if elapsed < timedelta(minutes=self.COOLDOWN_MINUTES):
-                return int((timedelta(minutes=self.COOLDOWN_MINUTES) - elapsed).total_seconds())
-        return None
+        remaining = self.bot.get_cog('RateLimiter').retry_after(
+            user_id, 'trivia', None, 1, self.COOLDOWN_MINUTES * 60, persist=True
+        )
+        return int(remaining) + 1 if remaining else None
 
     @discord.app_commands.command(name="trivia", description="Play a trivia game with AURAcoin betting")
-    @discord.app_commands.describe(amount="Amount of AURAcoin to bet (10-1000 AC)")
-    async def trivia(self, interaction: discord.Interaction, amount: int):
+    @discord.app_commands.describe(
+        amount="Amount of AURAcoin to bet (10-1000 AC)",
+        category="Question category (random if not set)",
+        difficulty="Question difficulty (random if not set)"
+    )
+    @discord.app_commands.choices(
+        category=[discord.app_commands.Choice(name=c.title(), value=c) for c in TRIVIA_CATEGORIES],
+        difficulty=[discord.app_commands.Choice(name=d.title(), value=d) for d in TRIVIA_DIFFICULTIES]
+    )
+    async def trivia(self, interaction: discord.Interaction, amount: int,
+                     category: Optional[str] = None, difficulty: Optional[str] = None):
         """Start a new trivia game with betting."""
+        channel_id = interaction.channel_id
+        game = None
         try:
             await interaction.response.defer(thinking=True)
             
             if not await self._validate_trivia_start(interaction, amount):
                 return
+
+            # Claim the channel right after validation (no await in between), so
+            # other channels are never blocked by this game's setup
+            game = TriviaGame(self.bot, channel_id, interaction.user.id, amount)
+            self.active_games[channel_id] = game
                 
-            async with self.lock:
-                game = TriviaGame(self.bot, interaction.channel_id, interaction.user.id, amount)
-                self.active_games[interaction.channel_id] = game
+            try:
+                question_data = await self._get_question(channel_id, category, difficulty)
+            except LLMUnavailableError:
+                await interaction.followup.send(
+                    "Trivia is unavailable right now because the question generator is offline. "
+                    "Please try again in a minute.",
+                    ephemeral=True
+                )
+                return
+            if not question_data:
+                await self._handle_generation_failure(interaction)
+                return
                 
-                # Generate and send question
-                question_data = await self._generate_trivia_question()
-                if not question_data:
-                    await self._handle_generation_failure(interaction, amount)
-                    return
-                    
-                await game.start_game(interaction, question_data)
-                self.cooldowns[interaction.user.id] = datetime.now()
+            self._mark_seen(channel_id, question_data)
+            await game.start_game(interaction, question_data)
+            self.bot.get_cog('RateLimiter').consume(
+                interaction.user.id, 'trivia', None, 1, self.COOLDOWN_MINUTES * 60, persist=True
+            )
 
         except Exception as e:
             await self._handle_error(interaction, "starting trivia game", e)
+        finally:
+            # Once started, the game releases the channel itself when it ends
+            if game is not None and not game.started:
+                game._cleanup_game()
+
+    async def _get_question(self, channel_id: int, category: Optional[str],
+                            difficulty: Optional[str]) -> Optional[dict]:
+        """Serve a ready question from the pool; generate live only if it's empty.
+
+        A live question the channel saw recently is regenerated, up to
+        LIVE_GENERATION_ATTEMPTS times, rather than failing the game.
+
+        Raises:
+            LLMUnavailableError: If the pool is empty and the LLM backend is down.
+        """
+        question_data = self._pop_pool_question(channel_id, category, difficulty)
+        if question_data:
+            return question_data
+        if not self.bot.get_cog('LLMBackend').is_available():
+            raise LLMUnavailableError("The question generator is offline.")
+        for _ in range(self.LIVE_GENERATION_ATTEMPTS):
+            async with self.generation_slots:
+                question_data = await self._generate_trivia_question(
+                    category or random.choice(TRIVIA_CATEGORIES),
+                    difficulty or random.choice(TRIVIA_DIFFICULTIES)
+                )
+            if not question_data:
+                return None
+            if self._accept_live_question(channel_id, question_data):
+                return question_data
+            # The pool may have been refilled while we were generating
+            question_data = self._pop_pool_question(channel_id, category, difficulty)
+            if question_data:
+                return question_data
+        return None
+
+    @discord.app_commands.command(name="trivia_round", description="Start a channel-wide trivia round anyone can bet on")
+    @discord.app_commands.describe(
+        category="Question category (random if not set)",
+        difficulty="Question difficulty (random if not set)"
+    )
+    @discord.app_commands.choices(
+        category=[discord.app_commands.Choice(name=c.title(), value=c) for c in TRIVIA_CATEGORIES],
+        difficulty=[discord.app_commands.Choice(name=d.title(), value=d) for d in TRIVIA_DIFFICULTIES]
+    )
+    async def trivia_round(self, interaction: discord.Interaction,
+                           category: Optional[str] = None, difficulty: Optional[str] = None):
+        """Start a round where every player in the channel can answer one question."""
+        channel_id = interaction.channel_id
+        trivia_round = None
+        try:
+            await interaction.response.defer(thinking=True)
+
+            if channel_id in self.active_games:
+                await interaction.followup.send(
+                    "A game is already in progress in this channel.",
+                    ephemeral=True
+                )
+                return
+
+            trivia_round = TriviaRound(self.bot, channel_id, self.MIN_BET, self.MAX_BET, self.held_bets)
+            self.active_games[channel_id] = trivia_round
+
+            try:
+                question_data = await self._get_question(channel_id, category, difficulty)
+            except LLMUnavailableError:
+                question_data = None
+            if not question_data:
+                await interaction.followup.send(
+                    "Failed to get a trivia question. Please try again in a minute.",
+                    ephemeral=True
+                )
+                return
+
+            self._mark_seen(channel_id, question_data)
+            await trivia_round.start_round(interaction, question_data)
+
+        except Exception as e:
+            await self._handle_error(interaction, "starting trivia round", e)
+        finally:
+            if trivia_round is not None and not trivia_round.started:
+                trivia_round._cleanup_game()
 
     async def _validate_trivia_start(self, interaction: discord.Interaction, amount: int) -> bool:
         """Validate conditions for starting a trivia game."""
@@ -93,160 +487,132 @@ class Trivia(commands.Cog):
             )
             return False
 
-        # Check balance
-        balance = self.bot.get_cog('AURAcoin').get_auracoin_balance(interaction.user.id)
+        # Check balance, minus anything staked in open trivia rounds
+        balance = (self.bot.get_cog('AURAcoin').get_auracoin_balance(interaction.user.id)
+                   - self.held_bets[interaction.user.id])
         if amount > balance:
             await interaction.followup.send(
-                f"Insufficient balance. You have {balance} AC.",
+                f"Insufficient balance. You have {balance} AC available.",
                 ephemeral=True
             )
             return False
 
         return True
 
-    async def _generate_trivia_question(self) -> Optional[dict]:
-        """Generate a trivia question using Ollama API with improved error handling."""
+    async def _generate_trivia_question(self, category: str, difficulty: str) -> Optional[dict]:
+        """Generate a single trivia question for a live game."""
+        questions = await self._generate_trivia_questions(category, difficulty, 1)
+        return questions[0] if questions else None
+
+    async def _generate_trivia_questions(self, category: str, difficulty: str, count: int) -> List[dict]:
+        """Generate several trivia questions in one request using Ollama's JSON mode.
+
+        The response is constrained to TRIVIA_RESPONSE_SCHEMA and validated by a
+        strict parser; invalid questions are dropped and counted in the metrics.
+        """
         prompt = (
-            "Generate a single trivia question with 4 options. Format exactly as follows:\n"
-            "Question: [Your question here]\n"
-            "A) [First option]\n"
-            "B) [Second option]\n"
-            "C) [Third option]\n"
-            "D) [Fourth option]\n"
-            "Answer: [A/B/C/D]\n"
-            "Explanation: [Brief explanation]\n"
+            f"Generate {count} different {difficulty} {category} trivia questions. "
+            "Each question has exactly 4 answer options, the letter (A, B, C or D) of the "
+            "correct option, and a one-sentence explanation. Respond with JSON only."
         )
 
+        self.generation_stats['requests'] += 1
+        self.generation_stats['questions_requested'] += count
+        start = time.monotonic()
         try:
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    "model": "llama3.2",
-                    "prompt": prompt,
-                    "stream": False,
-                    "temperature": 0.7,
-                    "max_tokens": 500
-                }
-                
-                # Debug log
-                print("Sending request to Ollama API...")
-                
-                async with session.post(
-                    "http://localhost:11434/api/generate",
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    if response.status != 200:
-                        print(f"Ollama API error: Status {response.status}")
-                        print(f"Response text: {await response.text()}")
-                        return None
-
-                    try:
-                        result = await response.json()
-                        content = result.get('response', '')
-                        
-                        # Debug log
-                        print("Raw API response:", content)
-                        
-                        if not content:
-                            print("Empty response from API")
-                            return None
-                            
-                        # Parse the response
-                        parsed = self._parse_question_response(content)
-                        if parsed:
-                            print("Successfully parsed question:", parsed)
-                            return parsed
-                        else:
-                            print("Failed to parse question response")
-                            return None
-
-                    except json.JSONDecodeError as e:
-                        print(f"JSON decode error: {e}")
-                        return None
-
-        except aiohttp.ClientError as e:
-            print(f"HTTP request error: {e}")
-            return None
-        except Exception as e:
-            print(f"Unexpected error in question generation: {e}")
-            return None
+            result = await self.bot.get_cog('LLMBackend').generate(
+                model="llama3.2",
+                prompt=prompt,
+                options={"temperature": 0.7, "num_predict": 250 * count},
+                timeout=30 * count,
+                format=TRIVIA_RESPONSE_SCHEMA
+            )
+        except LLMBackendError as e:
+            self.generation_stats['request_failures'] += 1
+            print(f"Ollama request error: {e}")
+            return []
+        finally:
+            self.generation_stats['generation_seconds'] += time.monotonic() - start
 
-    def _parse_question_response(self, content: str) -> Optional[dict]:
-        """Parse LLM response into structured question data."""
+        questions, rejected = self._parse_questions_json(result.get('response', ''))
+        questions = questions[:count]
+        self.generation_stats['questions_parsed'] += len(questions)
+        # Questions the model never returned count as failures too
+        self.generation_stats['questions_rejected'] += count - len(questions)
+        if rejected:
+            print(f"Rejected {rejected} malformed trivia question(s)")
+        return questions
+
+    @staticmethod
+    def _parse_questions_json(content: str) -> tuple:
+        """Strictly parse a JSON-mode trivia response.
+
+        Returns:
+            tuple: ``(questions, rejected)`` where ``questions`` is a list of valid
+            question dicts and ``rejected`` counts entries that failed validation.
+        """
         try:
-            # Debug log
-            print("Starting to parse content:", content)
-            
-            lines = [line.strip() for line in content.split('\n') if line.strip()]
-            data = {
-                'question': None,
-                'options': [],
-                'answer': None,
-                'explanation': None
-            }
+            data = json.loads(content)
+        except (json.JSONDecodeError, TypeError):
+            return [], 1
+        if not isinstance(data, dict) or not isinstance(data.get('questions'), list):
+            return [], 1
 
-            # More flexible question parsing
-            for line in lines:
-                if line.lower().startswith('here is') or line.lower().startswith('this is'):
-                    continue
-                elif 'question' not in line.lower() and data['question'] is None and '?' in line:
-                    data['question'] = line.strip()
-                elif line.startswith('Question:'):
-                    data['question'] = line[9:].strip()
-                elif line.startswith(('A)', 'B)', 'C)', 'D)')):
-                    data['options'].append(line[3:].strip())
-                elif line.startswith('Answer:'):
-                    # Handle combined answer and explanation
-                    answer_text = line[7:].strip()
-                    if ')' in answer_text:
-                        # Split on first occurrence of ')'
-                        answer_part, explanation_part = answer_text.split(')', 1)
-                        answer = answer_part.strip().upper()
-                        if 'explanation:' in explanation_part.lower():
-                            data['explanation'] = explanation_part.split(':', 1)[1].strip()
-                        else:
-                            data['explanation'] = explanation_part.strip()
-                    else:
-                        answer = answer_text.strip().upper()
-                    
-                    # Clean up the answer to just the letter
-                    answer = answer.replace(')', '').strip()
-                    if answer in ['A', 'B', 'C', 'D']:
-                        data['answer'] = answer
-                elif line.startswith('Explanation:'):
-                    data['explanation'] = line[12:].strip()
-
-            # If no explanation was provided, generate a simple one
-            if not data['explanation'] and data['answer']:
-                option_index = ord(data['answer']) - ord('A')
-                if 0 <= option_index < len(data['options']):
-                    data['explanation'] = f"The correct answer is {data['options'][option_index]}."
-
-            # Validate parsed data
-            if (data['question'] and 
-                len(data['options']) == 4 and 
-                data['answer'] and 
-                data['explanation']):
-                return data
-            else:
-                print("Invalid parsed data:", data)
-                return None
+        questions, rejected = [], 0
+        for item in data['questions']:
+            if not isinstance(item, dict):
+                rejected += 1
+                continue
+            question = item.get('question')
+            options = item.get('options')
+            answer = item.get('answer')
+            explanation = item.get('explanation')
+            if (
+                not isinstance(question, str) or not question.strip()
+                or not isinstance(options, list) or len(options) != 4
+                or not all(isinstance(option, str) and option.strip() for option in options)
+                or len({option.strip().lower() for option in options}) != 4
+                or not isinstance(answer, str) or answer.strip().upper() not in ('A', 'B', 'C', 'D')
+                or not isinstance(explanation, str) or not explanation.strip()
+            ):
+                rejected += 1
+                continue
+            questions.append({
+                'question': question.strip(),
+                'options': [option.strip() for option in options],
+                'answer': answer.strip().upper(),
+                'explanation': explanation.strip()
+            })
+        return questions, rejected
 
-        except Exception as e:
-            print(f"Error parsing question response: {e}")
-            return None
+    @discord.app_commands.command(name="trivia_stats", description="Show trivia question generation metrics")
+    async def trivia_stats(self, interaction: discord.Interaction):
+        """Show question generation cost and parse failure rate."""
+        stats = self.generation_stats
+        parsed = stats['questions_parsed']
+        requested = stats['questions_requested']
+        failure_rate = (stats['questions_rejected'] / requested * 100) if requested else 0.0
+        cost = (stats['generation_seconds'] / parsed) if parsed else 0.0
+        depth = self.conn.execute('SELECT COUNT(*) FROM trivia_questions').fetchone()[0]
+
+        embed = discord.Embed(title="📊 Trivia Generation Stats", color=discord.Color.blue())
+        embed.add_field(name="Requests", value=f"{stats['requests']} ({stats['request_failures']} failed)", inline=True)
+        embed.add_field(name="Questions", value=f"{parsed} of {requested} requested", inline=True)
+        embed.add_field(name="Parse failure rate", value=f"{failure_rate:.1f}%", inline=True)
+        embed.add_field(name="Cost per question", value=f"{cost:.1f} s", inline=True)
+        embed.add_field(name="Pool depth", value=str(depth), inline=True)
+        embed.add_field(name="Duplicates discarded", value=str(stats['duplicates_discarded']), inline=True)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
-    async def _handle_generation_failure(self, interaction: discord.Interaction, amount: int):
-        """Handle failure to generate question and refund bet."""
+    async def _handle_generation_failure(self, interaction: discord.Interaction):
+        """Tell the player no question could be generated.
+
+        /trivia does not take the bet before the question is posted, so there
+        is nothing to refund here.
+        """
         try:
-            auracoin_cog = self.bot.get_cog('AURAcoin')
-            auracoin_cog.update_balance(
-                interaction.user.id,
-                amount,
-                'trivia_refund'
-            )
             await interaction.followup.send(
-                "Failed to generate question. Your bet has been refunded.",
+                "Failed to generate question. No AC was taken, please try again.",
                 ephemeral=True
             )
         except Exception as e:
@@ -270,6 +636,7 @@ class TriviaGame:
         self.player_id = player_id
         self.bet_amount = bet_amount
         self.question_data = None
+        self.started = False
         self.answered = False
         self.timeout = 30.0
 
@@ -293,21 +660,20 @@ class TriviaGame:
         embed.set_footer(text=f"Bet: {self.bet_amount} AC | Time: {int(self.timeout)} seconds")
         await interaction.followup.send(embed=embed)
         
-        # Start answer handling
+        # Start answer handling; from here on the answer task owns cleanup
+        self.started = True
         self.bot.loop.create_task(self._handle_answer(interaction))
 
     async def _handle_answer(self, interaction: discord.Interaction):
         """Handle user answer with timeout."""
         def check(m):
-            return (
-                m.author.id == self.player_id and
-                m.channel.id == self.channel_id and
-                m.content.upper() in ['A', 'B', 'C', 'D']
-            )
+            return m.content.strip().upper() in ['A', 'B', 'C', 'D']
 
         try:
-            message = await self.bot.wait_for('message', check=check, timeout=self.timeout)
-            await self._process_answer(interaction, message.content.upper())
+            message = await self.bot.get_cog('MessageRouter').wait_for_message(
+                self.channel_id, self.player_id, check=check, timeout=self.timeout
+            )
+            await self._process_answer(interaction, message.content.strip().upper())
         except asyncio.TimeoutError:
             await self._handle_timeout(interaction)
         finally:
@@ -367,8 +733,141 @@ class TriviaGame:
 
     def _cleanup_game(self):
         """Clean up game resources."""
-        if self.channel_id in self.bot.get_cog('Trivia').active_games:
-            del self.bot.get_cog('Trivia').active_games[self.channel_id]
+        active_games = self.bot.get_cog('Trivia').active_games
+        if active_games.get(self.channel_id) is self:
+            del active_games[self.channel_id]
+
+class TriviaRound(TriviaGame):
+    """
+    Manages a channel-wide trivia round.
+
+    One question is posted and any number of players answer by sending
+    ``<letter> <bet>`` (e.g. ``B 50``) within the time window. Each player's
+    first valid entry counts. Accepted bets are held in the cog's escrow, so a
+    player cannot stake the same coins in two rounds at once, and all bets
+    settle in a single ledger transaction.
+    """
+
+    ENTRY_PATTERN = re.compile(r'^\s*([ABCD])\s+(\d+)\s*$', re.IGNORECASE)
+
+    def __init__(self, bot, channel_id: int, min_bet: int, max_bet: int, held_bets: Counter):
+        super().__init__(bot, channel_id, player_id=None, bet_amount=0)
+        self.min_bet = min_bet
+        self.max_bet = max_bet
+        self.held_bets = held_bets  # Shared across every active round
+        self.entries: Dict[int, tuple] = {}  # user_id: (answer, bet)
+        self.entries_closed = False
+        self.timeout = 45.0
+
+    async def start_round(self, interaction: discord.Interaction, question_data: dict):
+        """Post the question and start collecting entries."""
+        self.question_data = question_data
+
+        embed = discord.Embed(
+            title="🎯 Trivia Round",
+            description=(
+                f"{self.question_data['question']}\n\n"
+                f"Reply with your answer and bet, e.g. `B 50` "
+                f"({self.min_bet}-{self.max_bet} AC). Correct answers win their bet!"
+            ),
+            color=discord.Color.blue()
+        )
+        for letter, option in zip(['A', 'B', 'C', 'D'], self.question_data['options']):
+            embed.add_field(name=f"Option {letter}", value=option, inline=False)
+        embed.set_footer(text=f"Time: {int(self.timeout)} seconds")
+        await interaction.followup.send(embed=embed)
+
+        self.started = True
+        self.bot.loop.create_task(self._collect_entries(interaction))
+
+    def _is_entry(self, message) -> bool:
+        return (
+            message.author.id not in self.entries and
+            self.ENTRY_PATTERN.match(message.content) is not None
+        )
+
+    async def _collect_entries(self, interaction: discord.Interaction):
+        """Collect entries until the window closes, then settle every bet at once."""
+        try:
+            # Entries are handled as they arrive; the subscription resolves when time is up
+            await self.bot.get_cog('MessageRouter').subscribe(
+                self.channel_id, self._register_entry, check=self._is_entry, timeout=self.timeout
+            )
+            await self._settle(interaction)
+        except Exception as e:
+            print(f"Error running trivia round: {e}")
+        finally:
+            self.entries_closed = True
+            self._release_holds()
+            self._cleanup_game()
+
+    def _release_holds(self):
+        """Return this round's stakes from the escrow. Safe to call more than once."""
+        for user_id, (answer, bet) in self.entries.items():
+            self.held_bets[user_id] -= bet
+            if self.held_bets[user_id] <= 0:
+                del self.held_bets[user_id]
+        self.entries = {}
+
+    async def _register_entry(self, message):
+        """Validate a player's entry, hold the bet and acknowledge it."""
+        # Handlers run as separate tasks, so a second quick message may get here
+        # after the first was accepted; checks and the hold happen before any await
+        if self.entries_closed or message.author.id in self.entries:
+            return
+        match = self.ENTRY_PATTERN.match(message.content)
+        answer, bet = match.group(1).upper(), int(match.group(2))
+
+        if not self.min_bet <= bet <= self.max_bet:
+            await message.reply(f"Bet must be between {self.min_bet} and {self.max_bet} AC.")
+            return
+        available = (self.bot.get_cog('AURAcoin').get_auracoin_balance(message.author.id)
+                     - self.held_bets[message.author.id])
+        if bet > available:
+            await message.reply(f"Insufficient balance. You have {available} AC available.")
+            return
+
+        self.held_bets[message.author.id] += bet
+        self.entries[message.author.id] = (answer, bet)
+        try:
+            await message.add_reaction('✅')
+        except discord.HTTPException:
+            pass
+
+    async def _settle(self, interaction: discord.Interaction):
+        """Settle all entries in one transaction and post the results."""
+        self.entries_closed = True
+        correct_answer = self.question_data['answer']
+        embed = discord.Embed(
+            title="🎯 Trivia Round Results",
+            description=(
+                f"Correct answer: {correct_answer}\n"
+                f"Explanation: {self.question_data['explanation']}"
+            ),
+            color=discord.Color.gold()
+        )
+
+        if not self.entries:
+            embed.add_field(name="Players", value="Nobody answered this round.", inline=False)
+            await interaction.channel.send(embed=embed)
+            return
+
+        changes = []
+        lines = []
+        for user_id, (answer, bet) in self.entries.items():
+            if answer == correct_answer:
+                changes.append((user_id, bet, 'trivia_round_win'))
+                lines.append(f"🏆 <@{user_id}> answered {answer} and won {bet} AC")
+            else:
+                changes.append((user_id, -bet, 'trivia_round_loss'))
+                lines.append(f"💔 <@{user_id}> answered {answer} and lost {bet} AC")
+
+        self.bot.get_cog('AURAcoin').update_balances(changes)
+        player_count = len(self.entries)
+        self._release_holds()
+
+        embed.add_field(name=f"Players ({player_count})", value='\n'.join(lines)[:1024], inline=False)
+        await interaction.channel.send(embed=embed)
 
 async def setup(bot):
     """Load the Trivia cog."""
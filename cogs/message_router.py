@@ -0,0 +1,150 @@
+# message_router.py
+
+import asyncio
+from discord.ext import commands, tasks
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class PendingWait:
+    """A registered wait for messages in a channel, optionally from one user."""
+
+    __slots__ = ('key', 'check', 'handler', 'future', 'rounds')
+
+    def __init__(self, key: Tuple[int, Optional[int]], check: Optional[Callable],
+                 handler: Optional[Callable], future: asyncio.Future):
+        self.key = key
+        self.check = check
+        self.handler = handler  # None for one-shot waits, a coroutine function for subscriptions
+        self.future = future
+        self.rounds = 0  # Remaining full turns of the timer wheel before expiry
+
+
+class MessageRouter(commands.Cog):
+    """
+    A cog that dispatches incoming messages to text-answer games.
+
+    Games register waits keyed by (channel_id, user_id), or (channel_id, None)
+    for channel-wide subscriptions, so each message is routed with a dictionary
+    lookup instead of running every pending ``bot.wait_for`` check. Timeouts are
+    handled by one shared timer wheel rather than a timer per wait.
+    """
+
+    TICK_SECONDS = 0.5
+    WHEEL_SLOTS = 256  # One revolution covers 128 seconds; longer waits use rounds
+
+    def __init__(self, bot):
+        """
+        Initialize the MessageRouter cog.
+
+        Args:
+            bot: An instance of the Discord bot.
+        """
+        self.bot = bot
+        self.waits: Dict[Tuple[int, Optional[int]], PendingWait] = {}
+        self.wheel: List[List[PendingWait]] = [[] for _ in range(self.WHEEL_SLOTS)]
+        self.current_slot = 0
+        self.timer_wheel.start()
+
+    def cog_unload(self):
+        """Stop the timer wheel and cancel every pending wait."""
+        self.timer_wheel.cancel()
+        for wait in self.waits.values():
+            if not wait.future.done():
+                wait.future.cancel()
+        self.waits.clear()
+
+    def _register(self, channel_id: int, user_id: Optional[int], check: Optional[Callable],
+                  handler: Optional[Callable], timeout: float) -> asyncio.Future:
+        key = (channel_id, user_id)
+        existing = self.waits.get(key)
+        if existing is not None and not existing.future.done():
+            raise ValueError(f"A message wait is already registered for {key}.")
+
+        wait = PendingWait(key, check, handler, self.bot.loop.create_future())
+        wait.future.add_done_callback(lambda _: self._discard(wait))
+        self.waits[key] = wait
+
+        # Round up to whole ticks, plus one because the next tick may be almost due:
+        # the wait fires after at least ``timeout`` and at most one tick later
+        ticks = max(1, int(-(-timeout // self.TICK_SECONDS))) + 1
+        wait.rounds = (ticks - 1) // self.WHEEL_SLOTS
+        self.wheel[(self.current_slot + ticks) % self.WHEEL_SLOTS].append(wait)
+        return wait.future
+
+    def _discard(self, wait: PendingWait):
+        if self.waits.get(wait.key) is wait:
+            del self.waits[wait.key]
+
+    def wait_for_message(self, channel_id: int, user_id: int, check: Optional[Callable] = None,
+                         timeout: float = 30.0) -> asyncio.Future:
+        """Wait for the next matching message from a user in a channel.
+
+        Args:
+            channel_id: The channel to listen in.
+            user_id: The user whose message is awaited.
+            check: Optional predicate the message must also satisfy.
+            timeout: Seconds to wait before giving up.
+
+        Returns:
+            asyncio.Future: Resolves to the message, or raises asyncio.TimeoutError.
+        """
+        return self._register(channel_id, user_id, check, None, timeout)
+
+    def subscribe(self, channel_id: int, handler: Callable, check: Optional[Callable] = None,
+                  timeout: float = 30.0) -> asyncio.Future:
+        """Feed every matching message in a channel to a handler until the timeout.
+
+        Args:
+            channel_id: The channel to listen in.
+            handler: Coroutine function called with each matching message.
+            check: Optional predicate messages must satisfy.
+            timeout: Seconds until the subscription ends.
+
+        Returns:
+            asyncio.Future: Resolves to None when the subscription ends.
+        """
+        return self._register(channel_id, None, check, handler, timeout)
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        """Route a message to the wait for its author, then to any channel-wide subscription."""
+        if message.author.bot or not self.waits:
+            return
+
+        wait = self.waits.get((message.channel.id, message.author.id))
+        if wait is not None and not wait.future.done() and (wait.check is None or wait.check(message)):
+            wait.future.set_result(message)
+
+        wait = self.waits.get((message.channel.id, None))
+        if wait is not None and not wait.future.done() and (wait.check is None or wait.check(message)):
+            self.bot.loop.create_task(wait.handler(message))
+
+    @tasks.loop(seconds=TICK_SECONDS)
+    async def timer_wheel(self):
+        """Advance the wheel one slot and expire the waits that are due."""
+        self.current_slot = (self.current_slot + 1) % self.WHEEL_SLOTS
+        slot = self.wheel[self.current_slot]
+        if not slot:
+            return
+
+        remaining = []
+        for wait in slot:
+            if wait.future.done():
+                continue
+            if wait.rounds > 0:
+                wait.rounds -= 1
+                remaining.append(wait)
+            elif wait.handler is None:
+                wait.future.set_exception(asyncio.TimeoutError())
+            else:
+                wait.future.set_result(None)
+        self.wheel[self.current_slot] = remaining
+
+
+async def setup(bot):
+    """Load the MessageRouter cog into the bot.
+
+    Args:
+        bot: An instance of the Discord bot.
+    """
+    await bot.add_cog(MessageRouter(bot))
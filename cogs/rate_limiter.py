@@ -0,0 +1,172 @@
+# rate_limiter.py
+
+import time
+import sqlite3
+import discord
+from collections import OrderedDict
+from discord import app_commands
+from discord.ext import commands, tasks
+from typing import Optional
+
+
+def cooldown(rate: int, per: float, *, persist: bool = False):
+    """An app_commands check backed by the shared RateLimiter cog.
+
+    Works like ``app_commands.checks.cooldown`` (one bucket per user, command and
+    guild) but uses bounded memory and can survive restarts.
+
+    Args:
+        rate: Number of uses allowed per window.
+        per: Window length in seconds.
+        persist: Store the bucket in SQLite so the cooldown survives restarts.
+
+    Raises:
+        app_commands.CommandOnCooldown: When the bucket is empty.
+    """
+    async def predicate(interaction: discord.Interaction) -> bool:
+        limiter = interaction.client.get_cog('RateLimiter')
+        if limiter is None:
+            return True
+        retry_after = limiter.consume(
+            interaction.user.id, interaction.command.qualified_name, interaction.guild_id,
+            rate, per, persist=persist
+        )
+        if retry_after:
+            raise app_commands.CommandOnCooldown(app_commands.Cooldown(rate, per), retry_after)
+        return True
+
+    return app_commands.check(predicate)
+
+
+class RateLimiter(commands.Cog):
+    """
+    A shared token-bucket rate limit and cooldown service.
+
+    Buckets are keyed by (user_id, command, guild_id). A bucket that has refilled
+    completely carries no information, so it is evicted; together with an LRU cap
+    this keeps memory bounded no matter how many users have ever played.
+    Buckets for persistent cooldowns are also written to SQLite.
+    """
+
+    MAX_BUCKETS = 50_000
+
+    def __init__(self, bot):
+        """
+        Initialize the RateLimiter cog.
+
+        Args:
+            bot: An instance of the Discord bot.
+        """
+        self.bot = bot
+        self.buckets = OrderedDict()  # (user_id, command, guild_id): [tokens, updated_at, per]
+        self.conn = sqlite3.connect('./group_memories/aura_memory.db', check_same_thread=False)
+        self.create_tables()
+        self.evict_expired.start()
+
+    def cog_unload(self):
+        """Stop the eviction task."""
+        self.evict_expired.cancel()
+
+    def create_tables(self):
+        """Creates the table for persistent buckets if it doesn't exist."""
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    user_id INTEGER NOT NULL,
+                    command TEXT NOT NULL,
+                    guild_id INTEGER NOT NULL,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, command, guild_id)
+                )
+            ''')
+
+    def _get_bucket(self, key, rate, per, persist, now):
+        """Return the bucket for a key refilled up to now, or None if it is full."""
+        bucket = self.buckets.get(key)
+        if bucket is None and persist:
+            row = self.conn.execute('''
+                SELECT tokens, updated_at FROM rate_limits
+                WHERE user_id = ? AND command = ? AND guild_id = ? AND expires_at > ?
+            ''', (*key, now)).fetchone()
+            if row:
+                bucket = [row[0], row[1], per]
+                self.buckets[key] = bucket
+        if bucket is None:
+            return None
+
+        tokens = min(rate, bucket[0] + (now - bucket[1]) * rate / per)
+        if tokens >= rate:
+            del self.buckets[key]
+            return None
+        bucket[0], bucket[1] = tokens, now
+        self.buckets.move_to_end(key)
+        return bucket
+
+    def retry_after(self, user_id: int, command: str, guild_id: Optional[int], rate: int, per: float,
+                    persist: bool = False) -> float:
+        """Return the seconds until one use is available, without consuming it.
+
+        Args:
+            user_id: The user's ID.
+            command: The command name.
+            guild_id: The guild ID, or None for DMs or global cooldowns.
+            rate: Number of uses allowed per window.
+            per: Window length in seconds.
+            persist: Whether the bucket is stored in SQLite.
+        """
+        key = (user_id, command, guild_id or 0)
+        bucket = self._get_bucket(key, rate, per, persist, time.time())
+        if bucket is None or bucket[0] >= 1:
+            return 0.0
+        return (1 - bucket[0]) * per / rate
+
+    def consume(self, user_id: int, command: str, guild_id: Optional[int], rate: int, per: float,
+                persist: bool = False) -> float:
+        """Take one use from a bucket.
+
+        Returns:
+            float: 0.0 if the use was allowed, otherwise the seconds to wait.
+        """
+        key = (user_id, command, guild_id or 0)
+        now = time.time()
+        bucket = self._get_bucket(key, rate, per, persist, now)
+        if bucket is None:
+            bucket = [float(rate), now, per]
+            self.buckets[key] = bucket
+        if bucket[0] < 1:
+            return (1 - bucket[0]) * per / rate
+
+        bucket[0] -= 1
+        while len(self.buckets) > self.MAX_BUCKETS:
+            self.buckets.popitem(last=False)
+
+        if persist:
+            # The bucket is full again after (rate - tokens) * per / rate seconds
+            expires_at = now + (rate - bucket[0]) * per / rate
+            with self.conn:
+                self.conn.execute('''
+                    INSERT OR REPLACE INTO rate_limits (user_id, command, guild_id, tokens, updated_at, expires_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (*key, bucket[0], now, expires_at))
+        return 0.0
+
+    @tasks.loop(minutes=5)
+    async def evict_expired(self):
+        """Drop buckets that have refilled completely, in memory and on disk."""
+        now = time.time()
+        expired = [key for key, (tokens, updated_at, per) in self.buckets.items() if now - updated_at >= per]
+        for key in expired:
+            del self.buckets[key]
+        with self.conn:
+            self.conn.execute('DELETE FROM rate_limits WHERE expires_at <= ?', (now,))
+
+
+async def setup(bot):
+    """Load the RateLimiter cog into the bot.
+
+    Args:
+        bot: An instance of the Discord bot.
+    """
+    await bot.add_cog(RateLimiter(bot))
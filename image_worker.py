@@ -0,0 +1,289 @@
+"""
+Out-of-process Stable Diffusion worker for the ImageGenerator cog.
+
+The cog starts this module with ``python -m image_worker MODEL_PATH`` and talks
+to it over stdin/stdout using length-prefixed pickle frames. The worker owns the
+pipeline, so torch never shares the bot's GIL or memory, and a crash or OOM only
+takes down this process.
+
+Messages from the bot:
+    {'type': 'generate', 'batch_id': str, 'settings': dict, 'jobs': [dict, ...], 'preview_every': int}
+    {'type': 'shutdown'}
+
+Messages to the bot:
+    {'type': 'ready', 'device': str}
+    {'type': 'progress', 'batch_id': str, 'step': int, 'total': int, 'preview': bytes or None}
+    {'type': 'result', 'batch_id': str, 'images': [bytes, ...]}
+    {'type': 'error', 'batch_id': str or None, 'error': str}
+
+Run ``python -m image_worker MODEL_PATH --benchmark`` to time every inference
+profile on the current machine.
+"""
+
+import gc
+import io
+import os
+import sys
+import json
+import time
+import pickle
+import struct
+import logging
+import argparse
+import traceback
+import psutil
+from dotenv import load_dotenv
+
+FRAME_HEADER = struct.Struct('>I')
+
+# Output formats: name -> (file extension, default quality, min quality, max quality).
+# For PNG the "quality" is the zlib compression level; for WebP and JPEG it is the encoder quality.
+IMAGE_FORMATS = {
+    'png': ('png', 6, 0, 9),
+    'webp': ('webp', 90, 1, 100),
+    'jpeg': ('jpg', 90, 1, 100),
+}
+
+# Inference profiles:
+#   default     - float16 with slicing on CUDA, plain float32 on CPU
+#   cpu         - tuned thread counts, bfloat16 where the CPU supports it, attention and VAE slicing
+#   cpu_compile - cpu plus torch.compile on the transformer (slow first call, faster after)
+PROFILES = ('default', 'cpu', 'cpu_compile')
+
+logger = logging.getLogger('ImageWorker')
+
+
+def read_message(stream):
+    """Read one framed message, or return None when the stream is closed."""
+    header = stream.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        return None
+    (length,) = FRAME_HEADER.unpack(header)
+    return pickle.loads(stream.read(length))
+
+
+def write_message(stream, message: dict):
+    """Write one framed message and flush it."""
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(FRAME_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+def resolve_profile(name: str) -> str:
+    """Map a profile name from IMAGE_PROFILE to one of PROFILES; "auto" picks by hardware."""
+    if name in PROFILES:
+        return name
+    import torch
+    return 'default' if torch.cuda.is_available() else 'cpu'
+
+
+def configure_cpu_threads(torch) -> int:
+    """Pin torch's thread pools: one intra-op thread per physical core, a single inter-op thread."""
+    threads = int(os.getenv('IMAGE_CPU_THREADS', 0)) or psutil.cpu_count(logical=False) or os.cpu_count()
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Can only be set once per process, before any parallel work
+    return threads
+
+
+def cpu_supports_bfloat16(torch) -> bool:
+    """Check for native bfloat16 matmul support (AVX512-BF16 or AMX); emulated bfloat16 is slower than float32."""
+    checks = ('_is_avx512_bf16_supported', '_is_amx_tile_supported')
+    return any(getattr(torch.cpu, check, lambda: False)() for check in checks)
+
+
+def load_pipeline(model_path: str, profile: str = 'default'):
+    """Load the Stable Diffusion 3 pipeline with one of PROFILES.
+
+    Returns:
+        tuple: The pipeline and a description of the device it runs on.
+    """
+    import torch
+    from diffusers import StableDiffusion3Pipeline
+
+    if profile != 'default':
+        return load_cpu_pipeline(model_path, profile)
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    logger.info(f"Loading Stable Diffusion model from {model_path} on {device}...")
+
+    # Add more detailed logging about system state
+    logger.info(f"CUDA available: {torch.cuda.is_available()}")
+    if torch.cuda.is_available():
+        logger.info(f"CUDA device: {torch.cuda.get_device_name(0)}")
+        logger.info(f"CUDA memory allocated: {torch.cuda.memory_allocated(0)}")
+
+    pipe = StableDiffusion3Pipeline.from_pretrained(
+        model_path,
+        torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
+        use_safetensors=True,
+        variant="fp16" if torch.cuda.is_available() else None,
+        token=os.getenv('HUGGINGFACE_TOKEN')
+    ).to(device)
+
+    # Enable memory efficient attention if using CUDA
+    if torch.cuda.is_available():
+        pipe.enable_attention_slicing()
+        pipe.enable_vae_slicing()
+    return pipe, device
+
+
+def load_cpu_pipeline(model_path: str, profile: str):
+    """Load the pipeline with the CPU-tuned ``cpu`` or ``cpu_compile`` profile."""
+    import torch
+    from diffusers import StableDiffusion3Pipeline
+
+    threads = configure_cpu_threads(torch)
+    dtype = torch.bfloat16 if cpu_supports_bfloat16(torch) else torch.float32
+    logger.info(f"Loading Stable Diffusion model from {model_path} on cpu ({profile}, {threads} threads, {dtype})...")
+
+    pipe = StableDiffusion3Pipeline.from_pretrained(
+        model_path,
+        torch_dtype=dtype,
+        use_safetensors=True,
+        token=os.getenv('HUGGINGFACE_TOKEN')
+    )
+    pipe.enable_attention_slicing()
+    pipe.enable_vae_slicing()
+    if profile == 'cpu_compile':
+        pipe.transformer = torch.compile(pipe.transformer)
+    return pipe, f"cpu ({profile}, {threads} threads, {str(dtype).replace('torch.', '')})"
+
+
+def encode_image(image, image_format: str, quality: int) -> bytes:
+    """Encode a PIL image in memory in one of IMAGE_FORMATS."""
+    buffer = io.BytesIO()
+    if image_format == 'png':
+        image.save(buffer, format="PNG", compress_level=quality)
+    elif image_format == 'webp':
+        image.save(buffer, format="WEBP", quality=quality)
+    else:
+        image.convert("RGB").save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def decode_preview(pipe, latents) -> bytes:
+    """Decode the first image of a batch of latents into a small JPEG preview."""
+    latents = latents[:1] / pipe.vae.config.scaling_factor + pipe.vae.config.shift_factor
+    decoded = pipe.vae.decode(latents.to(pipe.vae.dtype), return_dict=False)[0]
+    image = pipe.image_processor.postprocess(decoded, output_type="pil")[0]
+    image.thumbnail((256, 256))
+    return encode_image(image, 'jpeg', 60)
+
+
+def generate(pipe, settings: dict, jobs: list, on_progress=None, preview_every: int = 0) -> list:
+    """Run one batched pipeline call and return each image encoded as its job requested.
+
+    Args:
+        pipe: The loaded pipeline.
+        settings: Shared ``num_inference_steps``, ``guidance_scale``, ``width`` and ``height``.
+        jobs: One dict per image with ``prompt``, ``negative_prompt``, ``seed``, ``format`` and ``quality``.
+        on_progress: Optional function called with (step, total, preview bytes or None) after each step.
+        preview_every: Decode a low-resolution preview every this many steps; 0 disables previews.
+    """
+    import torch
+
+    total = settings['num_inference_steps']
+
+    def step_end(pipeline, step, timestep, callback_kwargs):
+        if on_progress is not None:
+            preview = None
+            if preview_every and (step + 1) % preview_every == 0 and step + 1 < total:
+                preview = decode_preview(pipeline, callback_kwargs['latents'])
+            on_progress(step + 1, total, preview)
+        return callback_kwargs
+
+    negative_prompts = [job['negative_prompt'] or "" for job in jobs]
+    generators = [torch.Generator(device=pipe.device).manual_seed(job['seed']) for job in jobs]
+    images = pipe(
+        [job['prompt'] for job in jobs],
+        negative_prompt=negative_prompts if any(negative_prompts) else None,
+        generator=generators,
+        callback_on_step_end=step_end,
+        **settings
+    ).images
+
+    return [encode_image(image, job['format'], job['quality']) for image, job in zip(images, jobs)]
+
+
+def benchmark(model_path: str, profiles, steps: int, size: int) -> dict:
+    """Time one image per profile after a short warm-up run.
+
+    Returns:
+        dict: Profile name to seconds per image, or to an error message if the profile failed.
+    """
+    job = {'prompt': "a lighthouse on a cliff at sunset", 'negative_prompt': None, 'seed': 0, 'format': 'png', 'quality': 1}
+    settings = {'num_inference_steps': steps, 'guidance_scale': 7.0, 'width': size, 'height': size}
+    results = {}
+    for profile in profiles:
+        try:
+            pipe, _ = load_pipeline(model_path, profile)
+            # The warm-up also absorbs torch.compile's first-call cost
+            generate(pipe, {**settings, 'num_inference_steps': 2}, [job])
+            start = time.perf_counter()
+            generate(pipe, settings, [job])
+            results[profile] = time.perf_counter() - start
+        except Exception as e:
+            logger.error(traceback.format_exc())
+            results[profile] = f"failed: {e}"
+        pipe = None
+        gc.collect()
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Stable Diffusion worker process for AURA.")
+    parser.add_argument('model_path')
+    parser.add_argument('--benchmark', action='store_true', help="time each profile and print the results as JSON")
+    parser.add_argument('--profiles', default=','.join(PROFILES))
+    parser.add_argument('--steps', type=int, default=8)
+    parser.add_argument('--size', type=int, default=512)
+    args = parser.parse_args(argv)
+
+    load_dotenv('token.env')
+    logging.basicConfig(
+        filename='imagegenerator.log', encoding='utf-8', level=logging.INFO,
+        format='%(asctime)s:%(levelname)s:%(name)s: %(message)s'
+    )
+
+    # Keep the real stdout for frames; stray output from Python or native libraries goes to stderr
+    channel_out = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    channel_in = sys.stdin.buffer
+
+    if args.benchmark:
+        results = benchmark(args.model_path, args.profiles.split(','), args.steps, args.size)
+        channel_out.write(json.dumps(results).encode('utf-8') + b'\n')
+        channel_out.flush()
+        return 0
+
+    try:
+        pipe, device = load_pipeline(args.model_path, resolve_profile(os.getenv('IMAGE_PROFILE', 'auto')))
+    except Exception as e:
+        logger.exception("Failed to load Stable Diffusion model")
+        write_message(channel_out, {'type': 'error', 'batch_id': None, 'error': f"Failed to load model: {e}"})
+        return 1
+    write_message(channel_out, {'type': 'ready', 'device': device})
+
+    while True:
+        message = read_message(channel_in)
+        if message is None or message['type'] == 'shutdown':
+            return 0
+        batch_id = message['batch_id']
+
+        def report_progress(step, total, preview):
+            write_message(channel_out, {'type': 'progress', 'batch_id': batch_id, 'step': step, 'total': total, 'preview': preview})
+
+        try:
+            images = generate(pipe, message['settings'], message['jobs'], report_progress, message.get('preview_every', 0))
+            write_message(channel_out, {'type': 'result', 'batch_id': message['batch_id'], 'images': images})
+        except Exception as e:
+            logger.error(traceback.format_exc())
+            write_message(channel_out, {'type': 'error', 'batch_id': message['batch_id'], 'error': str(e)})
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,222 @@
+"""
+Monte Carlo simulator for the Blackjack cog's house rules.
+
+Plays millions of hands with NumPy, one array element per hand, split across
+worker processes, and reports the player's expected value, variance and bust
+rates for each rule set. Card values, payouts and dealer rules come from
+cogs/blackjack.py, and hands are settled in the same order as
+``BlackjackGame.determine_results``: a player bust loses, a two-card 21 pays
+the blackjack multiplier, then a dealer bust wins, then totals are compared.
+
+Cards are drawn with replacement (an infinite shoe). With the cog's six-deck
+shoe the difference in expected value is a few hundredths of a percent.
+
+Usage, from the repository root:
+    python tools/blackjack_sim.py --hands 10000000
+    python tools/blackjack_sim.py --rules house,h17,6to5 --strategy basic
+    python tools/blackjack_sim.py --strategy stand:15
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.blackjack import CARD_VALUES, DEALER_STANDS_ON, DEALER_HITS_SOFT_17, PAYOUT_MULTIPLIERS
+
+CARD_VALUE_TABLE = np.array(CARD_VALUES, dtype=np.int8)
+
+# Rule sets: dealer stand total, whether the dealer hits soft 17, and the multipliers
+# returned to the player (stake included) for a blackjack and an ordinary win.
+RULE_SETS = {
+    'house': {
+        'stands_on': DEALER_STANDS_ON,
+        'hits_soft_17': DEALER_HITS_SOFT_17,
+        'blackjack': PAYOUT_MULTIPLIERS['blackjack'],
+        'win': PAYOUT_MULTIPLIERS['win'],
+    },
+    'h17': {'stands_on': 17, 'hits_soft_17': True, 'blackjack': 2.5, 'win': 2.0},
+    '6to5': {'stands_on': 17, 'hits_soft_17': False, 'blackjack': 2.2, 'win': 2.0},
+    'even_money': {'stands_on': 17, 'hits_soft_17': False, 'blackjack': 2.0, 'win': 2.0},
+}
+
+
+def stand_on_strategy(total: int) -> np.ndarray:
+    """Hit below a fixed total regardless of the dealer's card."""
+    table = np.zeros((2, 32, 12), dtype=bool)
+    table[:, :total, :] = True
+    return table
+
+
+def basic_strategy() -> np.ndarray:
+    """Hit/stand basic strategy (the bot has no doubling or splitting)."""
+    table = np.zeros((2, 32, 12), dtype=bool)
+    # Hard totals: indexed [soft, player total, dealer up card value 2-11]
+    table[0, :12, :] = True
+    table[0, 12, [2, 3, 7, 8, 9, 10, 11]] = True
+    table[0, 13:17, 7:12] = True
+    # Soft totals
+    table[1, :18, :] = True
+    table[1, 18, [9, 10, 11]] = True
+    return table
+
+
+def parse_strategy(name: str) -> np.ndarray:
+    """Build a hit table from ``basic``, ``dealer`` or ``stand:N``.
+
+    Returns:
+        np.ndarray: Booleans indexed [soft, player total, dealer up card value], True to hit.
+    """
+    if name == 'basic':
+        return basic_strategy()
+    if name == 'dealer':
+        return stand_on_strategy(DEALER_STANDS_ON)
+    if name.startswith('stand:'):
+        return stand_on_strategy(int(name.split(':', 1)[1]))
+    raise ValueError(f"Unknown strategy: {name}")
+
+
+def deal(rng, size: int):
+    """Draw one card value per hand."""
+    return CARD_VALUE_TABLE[rng.integers(0, 52, size=size)]
+
+
+def add_cards(totals, soft_aces, values):
+    """Add one card to each hand, counting aces as 11 until that would bust (see cogs.blackjack.Hand)."""
+    totals += values
+    soft_aces += values == 11
+    for _ in range(2):  # An ace onto a soft 21 needs two aces demoted
+        demote = (totals > 21) & (soft_aces > 0)
+        totals -= 10 * demote
+        soft_aces -= demote
+
+
+def simulate(args) -> dict:
+    """Play one chunk of hands and return sums for aggregation.
+
+    Args:
+        args: Tuple of (rules dict, hit table, number of hands, seed).
+    """
+    rules, hit_table, hands, seed = args
+    rng = np.random.default_rng(seed)
+
+    totals = np.zeros(hands, dtype=np.int8)
+    soft_aces = np.zeros(hands, dtype=np.int8)
+    dealer_totals = np.zeros(hands, dtype=np.int8)
+    dealer_soft = np.zeros(hands, dtype=np.int8)
+
+    for _ in range(2):
+        add_cards(totals, soft_aces, deal(rng, hands))
+    up_card = deal(rng, hands)
+    add_cards(dealer_totals, dealer_soft, up_card)
+    add_cards(dealer_totals, dealer_soft, deal(rng, hands))
+    blackjack = totals == 21
+
+    # Player turns: only hands still hitting draw a card each pass
+    active = np.flatnonzero(hit_table[(soft_aces > 0).astype(np.int8), totals, up_card] & (totals < 21))
+    while active.size:
+        t, s = totals[active], soft_aces[active]
+        add_cards(t, s, deal(rng, active.size))
+        totals[active], soft_aces[active] = t, s
+        keep = hit_table[(s > 0).astype(np.int8), t, up_card[active]] & (t < 21)
+        active = active[keep]
+
+    # Dealer turn, as in BlackjackGame.play_dealer_hand
+    stands_on, hits_soft_17 = rules['stands_on'], rules['hits_soft_17']
+
+    def dealer_hits(t, s):
+        return (t < stands_on) | (hits_soft_17 & (t == stands_on) & (s > 0))
+
+    active = np.flatnonzero(dealer_hits(dealer_totals, dealer_soft))
+    while active.size:
+        t, s = dealer_totals[active], dealer_soft[active]
+        add_cards(t, s, deal(rng, active.size))
+        dealer_totals[active], dealer_soft[active] = t, s
+        active = active[dealer_hits(t, s)]
+
+    # Settle in the order of BlackjackGame.determine_results
+    player_bust = totals > 21
+    dealer_bust = dealer_totals > 21
+    natural = blackjack & ~player_bust
+    rest = ~player_bust & ~natural
+    win = rest & (dealer_bust | (totals > dealer_totals))
+    push = rest & ~dealer_bust & (totals == dealer_totals)
+
+    net = np.full(hands, -1.0)
+    net[natural] = rules['blackjack'] - 1
+    net[win] = rules['win'] - 1
+    net[push] = 0.0
+
+    return {
+        'hands': hands,
+        'net': float(net.sum()),
+        'net_squared': float(np.square(net).sum()),
+        'player_busts': int(player_bust.sum()),
+        'dealer_busts': int(dealer_bust.sum()),
+        'blackjacks': int(natural.sum()),
+        'wins': int(win.sum()),
+        'pushes': int(push.sum()),
+    }
+
+
+def run(rules: dict, hit_table: np.ndarray, hands: int, processes: int, chunk: int, seed=None) -> dict:
+    """Simulate ``hands`` hands of one rule set across a process pool.
+
+    Returns:
+        dict: Expected value and standard deviation per unit bet, and outcome rates.
+    """
+    sizes = [chunk] * (hands // chunk) + ([hands % chunk] if hands % chunk else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(rules, hit_table, size, child) for size, child in zip(sizes, seeds)]
+    with Pool(processes) as pool:
+        parts = pool.map(simulate, jobs)
+
+    totals = {key: sum(part[key] for part in parts) for key in parts[0]}
+    n = totals['hands']
+    ev = totals['net'] / n
+    variance = totals['net_squared'] / n - ev * ev
+    return {
+        'hands': n,
+        'ev': ev,
+        'variance': variance,
+        'std_error': (variance / n) ** 0.5,
+        'player_bust_rate': totals['player_busts'] / n,
+        'dealer_bust_rate': totals['dealer_busts'] / n,
+        'blackjack_rate': totals['blackjacks'] / n,
+        'win_rate': (totals['wins'] + totals['blackjacks']) / n,
+        'push_rate': totals['pushes'] / n,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Simulate AURA blackjack house rules.")
+    parser.add_argument('--hands', type=int, default=10_000_000, help="hands per rule set")
+    parser.add_argument('--rules', default='house', help=f"comma-separated rule sets: {', '.join(RULE_SETS)}")
+    parser.add_argument('--strategy', default='basic', help="basic, dealer, or stand:N")
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk', type=int, default=500_000, help="hands per task")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    hit_table = parse_strategy(args.strategy)
+    for name in args.rules.split(','):
+        rules = RULE_SETS[name]
+        start = time.perf_counter()
+        result = run(rules, hit_table, args.hands, args.processes, args.chunk, args.seed)
+        elapsed = time.perf_counter() - start
+        print(f"{name} ({args.strategy}): {result['hands']:,} hands in {elapsed:.1f}s")
+        print(f"  EV per unit bet:  {result['ev']:+.4%} (± {1.96 * result['std_error']:.4%})")
+        print(f"  Variance:         {result['variance']:.4f}")
+        print(f"  Player bust rate: {result['player_bust_rate']:.2%}")
+        print(f"  Dealer bust rate: {result['dealer_bust_rate']:.2%}")
+        print(f"  Win / push rate:  {result['win_rate']:.2%} / {result['push_rate']:.2%}")
+        print(f"  Blackjack rate:   {result['blackjack_rate']:.2%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))